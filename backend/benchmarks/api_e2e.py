@@ -0,0 +1,240 @@
+"""
+Benchmark de extremo a extremo de la API: arranca la app de backend.main con
+sustitutos locales (sqlite, Qdrant en memoria, un Ollama falso y un broker en
+memoria) y lanza subidas, listados, descargas, borrados y /chat con una
+concurrencia fija. Imprime p50/p95/p99 y peticiones por segundo por endpoint
+en JSON; con --output se guarda también en un fichero para comparar entre
+ejecuciones.
+
+    cd backend && PYTHONPATH=src python -m benchmarks.api_e2e
+    cd backend && PYTHONPATH=src python -m benchmarks.api_e2e --concurrency 32 --output e2e.json
+    cd backend && PYTHONPATH=src python -m benchmarks.api_e2e --baseline e2e.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from contextlib import redirect_stdout
+from datetime import UTC, datetime
+from typing import Any
+
+import httpx
+
+from benchmarks.stubs import FakeOllama, random_vector, seed_chunks, summarize
+
+Operation = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+async def run_phase(
+    client: httpx.AsyncClient,
+    operation: Operation,
+    requests: int,
+    concurrency: int,
+) -> dict[str, Any]:
+    # Siempre hay `concurrency` peticiones en vuelo hasta completar `requests`
+    latencies: list[float] = []
+    errors = 0
+    statuses: Counter[str] = Counter()
+    counter = iter(range(requests))
+
+    async def user() -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await operation(client, i)
+                statuses[str(response.status_code)] += 1
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {**summarize(latencies, elapsed), "errors": errors, "statuses": dict(statuses)}
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    os.environ["MYSQL_URL"] = f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["QDRANT_URL"] = ":memory:"
+
+    rng = random.Random(args.seed)
+    report: dict[str, Any] = {
+        "started_at": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "phases")
+        },
+        "endpoints": {},
+    }
+
+    async with FakeOllama(delay=args.llm_delay) as fake_llm:
+        os.environ["LLM_URL"] = fake_llm.url
+
+        from backend.core.config import settings
+        from backend.core.db import engine, init_db, pool_stats
+        from backend.main import app, on_chunks_changed
+        from backend.services import llm, qdrant, rabbitmq
+        from benchmarks.broker import InMemoryBroker
+
+        # Mismos pasos que el lifespan, con el broker en memoria en lugar de
+        # RabbitMQ (ASGITransport no ejecuta el lifespan)
+        broker = InMemoryBroker(confirm_delay=args.broker_delay)
+        rabbitmq.publisher = broker
+        await init_db()
+        await broker.start()
+        await broker.subscribe(settings.RABBITMQ_EVENTS_EXCHANGE, on_chunks_changed)
+        await qdrant.connect()
+        await llm.connect()
+        wallets = await seed_chunks(
+            qdrant.get_client(), settings.QDRANT_COLLECTION, args.wallets, 10
+        )
+
+        api = settings.API_V1_STR
+        uploaded: list[tuple[str, str]] = []
+        etags: dict[tuple[str, str], str] = {}
+        payloads = [
+            b"%PDF-1.4\n" + rng.randbytes(args.file_size) for _ in range(max(1, args.unique_files))
+        ]
+
+        async def upload(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            wallet = wallets[i % len(wallets)]
+            files = {"file": (f"programa_{i}.pdf", payloads[i % len(payloads)])}
+            response = await client.post(f"{api}/{wallet}/file", files=files)
+            if response.status_code == 201:
+                uploaded.append((wallet, response.text))
+            return response
+
+        async def list_files(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await client.get(f"{api}/{wallets[i % len(wallets)]}/file")
+
+        async def list_wallets(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await client.get(f"{api}/wallets")
+
+        async def download(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            wallet, filename = uploaded[i % len(uploaded)]
+            response = await client.get(f"{api}/{wallet}/file/{filename}/download")
+            if "etag" in response.headers:
+                etags[(wallet, filename)] = response.headers["etag"]
+            return response
+
+        async def revalidate(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            wallet, filename = uploaded[i % len(uploaded)]
+            headers = {"If-None-Match": etags.get((wallet, filename), "*")}
+            return await client.get(f"{api}/{wallet}/file/{filename}/download", headers=headers)
+
+        async def download_base64(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            wallet, filename = uploaded[i % len(uploaded)]
+            return await client.get(f"{api}/{wallet}/file/{filename}/base64")
+
+        async def chat(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            body = {"message": "educación", "embedding": random_vector(384, rng)}
+            return await client.post(f"{api}/chat", json=body)
+
+        async def delete(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            wallet, filename = uploaded[i]
+            return await client.delete(f"{api}/{wallet}/file/{filename}")
+
+        phases: dict[str, tuple[Operation, int]] = {
+            "upload": (upload, args.requests),
+            "list_files": (list_files, args.requests),
+            "list_wallets": (list_wallets, args.requests),
+            "download": (download, args.requests),
+            "download_304": (revalidate, args.requests),
+            "download_base64": (download_base64, args.requests),
+            "chat": (chat, args.chats),
+            "delete": (delete, args.requests),
+        }
+        selected = args.phases.split(",") if args.phases else list(phases)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            for name in selected:
+                operation, requests = phases[name]
+                if name != "upload" and operation is not chat and not uploaded:
+                    continue
+                if name == "delete":
+                    requests = min(requests, len(uploaded))
+                report["endpoints"][name] = await run_phase(
+                    client, operation, requests, args.concurrency
+                )
+                print(f"[📊] {name}: {report['endpoints'][name]}", flush=True)
+
+        report["db_pool"] = pool_stats()
+        report["broker"] = {**broker.stats(), "messages": len(broker.messages)}
+        report["llm_requests"] = fake_llm.requests
+
+        await llm.close()
+        await qdrant.close()
+        await broker.close()
+        await engine.dispose()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any]) -> dict[str, Any]:
+    # Cociente actual / referencia: p95 > 1 o rps < 1 indican una regresión
+    ratios: dict[str, Any] = {}
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        ratios[name] = {
+            key: round(current[key] / previous[key], 3)
+            for key in ("p50_ms", "p95_ms", "p99_ms", "rps")
+            if current.get(key) and previous.get(key)
+        }
+    return ratios
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--wallets", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=64 * 1024)
+    parser.add_argument("--unique-files", type=int, default=50)
+    parser.add_argument("--llm-delay", type=float, default=0.05)
+    parser.add_argument("--broker-delay", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--phases", default="", help="p. ej. upload,download,chat")
+    parser.add_argument("--output", default="")
+    parser.add_argument("--baseline", default="", help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+    # Los logs del backend y el progreso van a stderr: stdout queda solo con el JSON
+    with redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Importar solo después de fijar las variables de entorno del backend
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from backend.core.config import settings
+from backend.services.rabbitmq import Pending, RabbitMQPublisher
+
+
+class InMemoryBroker(RabbitMQPublisher):
+    # Sustituto de RabbitMQ dentro del proceso: conserva el outbox, los lotes
+    # y el backpressure del publicador real, pero cada lote "se confirma" tras
+    # una espera fija y los mensajes se quedan en memoria
+    def __init__(self, confirm_delay: float = 0.002) -> None:
+        super().__init__(
+            url="memory://",
+            queue=settings.RABBITMQ_QUEUE,
+            pool_size=settings.RABBITMQ_CHANNEL_POOL_SIZE,
+            outbox_size=settings.RABBITMQ_OUTBOX_SIZE,
+            batch_size=settings.RABBITMQ_PUBLISH_BATCH_SIZE,
+            linger=settings.RABBITMQ_PUBLISH_LINGER,
+            max_attempts=settings.RABBITMQ_PUBLISH_MAX_ATTEMPTS,
+        )
+        self.confirm_delay = confirm_delay
+        self.messages: list[dict[str, Any]] = []
+        self.handlers: list[Callable[[dict[str, Any]], Awaitable[None]]] = []
+
+    async def start(self, retries: int = 10, delay: float = 3) -> None:
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def subscribe(
+        self,
+        exchange_name: str,
+        handler: Callable[[dict[str, Any]], Awaitable[None]],
+    ) -> None:
+        self.handlers.append(handler)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        if self._flusher is None:
+            return
+        await asyncio.wait_for(self._outbox.join(), timeout)
+        self._flusher.cancel()
+        self._flusher = None
+
+    async def _publish_batch(self, batch: list[Pending]) -> None:
+        try:
+            start = time.perf_counter()
+            await asyncio.sleep(self.confirm_delay)
+            self.messages.extend(message for message, _ in batch)
+            elapsed = time.perf_counter() - start
+            for _ in batch:
+                self.latency.observe(elapsed)
+            self.batches += 1
+        finally:
+            self._slots.release()
+            for _ in batch:
+                self._outbox.task_done()
@@ -0,0 +1,95 @@
+"""
+Mide si los endpoints de ficheros siguen respondiendo mientras hay muchas
+peticiones a /chat pendientes de un LLM lento.
+
+    cd backend && PYTHONPATH=src python -m benchmarks.chat_concurrency --chats 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any
+
+from benchmarks.stubs import FakeOllama, random_vector, seed_chunks, summarize
+
+
+async def run(chats: int, llm_delay: float, probe_interval: float) -> dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="bench-chat-")
+    os.environ.setdefault("MYSQL_URL", f"sqlite+aiosqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+    os.environ["QDRANT_URL"] = ":memory:"
+
+    async with FakeOllama(delay=llm_delay) as fake_llm:
+        os.environ["LLM_URL"] = fake_llm.url
+
+        import httpx
+
+        from backend.core.config import settings
+        from backend.core.db import init_db
+        from backend.main import app
+        from backend.services import llm, qdrant
+
+        await init_db()
+        await qdrant.connect()
+        await llm.connect()
+        wallets = await seed_chunks(qdrant.get_client(), settings.QDRANT_COLLECTION, 50, 10)
+
+        rng = random.Random(1)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            chat_latencies: list[float] = []
+            probe_latencies: list[float] = []
+
+            async def one_chat() -> None:
+                start = time.perf_counter()
+                response = await client.post(
+                    f"{settings.API_V1_STR}/chat",
+                    json={"message": "educación", "embedding": random_vector(384, rng)},
+                    timeout=None,
+                )
+                response.raise_for_status()
+                chat_latencies.append(time.perf_counter() - start)
+
+            async def probe(until: asyncio.Future[Any]) -> None:
+                while not until.done():
+                    start = time.perf_counter()
+                    response = await client.get(f"{settings.API_V1_STR}/{wallets[0]}/file")
+                    response.raise_for_status()
+                    probe_latencies.append(time.perf_counter() - start)
+                    await asyncio.sleep(probe_interval)
+
+            start = time.perf_counter()
+            pending = asyncio.gather(*(one_chat() for _ in range(chats)))
+            await asyncio.gather(pending, probe(pending))
+            elapsed = time.perf_counter() - start
+
+        await llm.close()
+        await qdrant.close()
+
+    return {
+        "chats": chats,
+        "llm_delay_s": llm_delay,
+        "elapsed_s": round(elapsed, 3),
+        "chat": summarize(chat_latencies, elapsed),
+        "file_listing_during_chats": summarize(probe_latencies, elapsed),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--llm-delay", type=float, default=2.0)
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.chats, args.llm_delay, args.probe_interval))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Mide el coste de listar y borrar los ficheros de una wallet con 10.000 filas,
+comparando el borrado fila a fila por el ORM con el DELETE único de
+database.remove_all, con y sin el índice por wallet.
+
+    cd backend && PYTHONPATH=src python -m benchmarks.file_removal
+    cd backend && PYTHONPATH=src python -m benchmarks.file_removal --db mysql+aiomysql://...
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+INDEX = "ix_uploadedfile_wallet_created"
+
+
+async def seed(files: int, wallets: int) -> None:
+    from sqlalchemy import insert
+
+    from backend.core.db import get_async_session
+    from backend.models.uploadedfile import UploadedFile
+    from backend.models.walletstats import WalletStats
+    from backend.services.wallets_cache import wallets_cache
+
+    start = datetime.now(UTC)
+    rows = [
+        {
+            "filename": f"{i:06d}_programa.pdf",
+            "wallet_address": f"0x{w:040x}",
+            "created_at": start + timedelta(milliseconds=i),
+            "mime_type": "application/pdf",
+            "content_hash": f"{i:064x}",
+            "size": 1024,
+        }
+        for w in range(wallets)
+        for i in range(files)
+    ]
+    async with get_async_session() as session:
+        for i in range(0, len(rows), 5000):
+            await session.execute(insert(UploadedFile), rows[i : i + 5000])
+        await session.execute(
+            insert(WalletStats),
+            [{"wallet_address": f"0x{w:040x}", "file_count": files} for w in range(wallets)],
+        )
+        await session.commit()
+    wallets_cache.invalidate()
+
+
+async def remove_per_row(wallet_address: str) -> list[Any]:
+    # Borrado anterior: SELECT al ORM y un DELETE por fila
+    from sqlmodel import select
+
+    from backend.core.db import get_async_session
+    from backend.models.uploadedfile import UploadedFile
+
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(UploadedFile).where(
+                UploadedFile.wallet_address == wallet_address,
+                UploadedFile.filename != "main",
+            )
+        )
+        files = result.all()
+        for (file,) in files:
+            await session.delete(file)
+        await session.commit()
+        return [file for (file,) in files]
+
+
+async def list_files(wallet_address: str) -> list[Any]:
+    from backend.services import database
+
+    return [file async for file in database.iter_files(wallet_address, 1000)]
+
+
+async def timed(coro: Any) -> tuple[float, Any]:
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="bench-removal-")
+    os.environ["MYSQL_URL"] = args.db or f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+
+    from sqlalchemy import text
+
+    from backend.core.db import engine, init_db
+    from backend.models.uploadedfile import UploadedFile
+    from backend.services import database
+
+    wallet = f"0x{0:040x}"
+    report: dict[str, Any] = {"files": args.files, "wallets": args.wallets}
+    for indexed in (False, True):
+        for mode in ("per_row", "bulk"):
+            async with engine.begin() as conn:
+                await conn.run_sync(UploadedFile.metadata.drop_all)
+            await init_db()
+            if not indexed:
+                async with engine.begin() as conn:
+                    drop = f"DROP INDEX {INDEX}"
+                    if engine.dialect.name == "mysql":
+                        drop += f" ON {UploadedFile.__tablename__}"
+                    await conn.execute(text(drop))
+            await seed(args.files, args.wallets)
+
+            page_time, _ = await timed(database.read_page(wallet, 100))
+            list_time, files = await timed(list_files(wallet))
+            wallets_time, _ = await timed(database.read_wallets())
+            remove = remove_per_row if mode == "per_row" else database.remove_all
+            remove_time, removed = await timed(remove(wallet))
+            assert len(files) == len(removed) == args.files
+            report[f"{mode}{'_indexed' if indexed else ''}"] = {
+                "read_page_ms": round(page_time * 1000, 2),
+                "list_all_ms": round(list_time * 1000, 2),
+                "read_wallets_ms": round(wallets_time * 1000, 2),
+                "remove_all_ms": round(remove_time * 1000, 2),
+            }
+    await engine.dispose()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="")
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--wallets", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
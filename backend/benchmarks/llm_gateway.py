@@ -0,0 +1,77 @@
+"""
+Ejercita el gateway del LLM contra dos servidores Ollama falsos: rechazo
+rápido cuando la cola está llena, coalescencia de prompts idénticos y reparto
+entre endpoints.
+
+    cd backend && PYTHONPATH=src python -m benchmarks.llm_gateway
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any
+
+from benchmarks.stubs import FakeOllama, summarize
+
+
+async def run(burst: int, concurrency: int, queue: int, delay: float) -> dict[str, Any]:
+    os.environ.setdefault("MYSQL_URL", "sqlite+aiosqlite://")
+    os.environ["LLM_MAX_CONCURRENCY"] = str(concurrency)
+    os.environ["LLM_MAX_QUEUE"] = str(queue)
+    os.environ["LLM_HEALTH_INTERVAL"] = "0.5"
+
+    async with FakeOllama(delay=delay) as first, FakeOllama(delay=delay) as second:
+        os.environ["LLM_URLS"] = f"{first.url},{second.url}"
+
+        from backend.services import llm
+
+        await llm.connect()
+        chunks = {"0x1": ["Propuesta sobre educación."]}
+
+        async def timed(query: str) -> tuple[str, float]:
+            start = time.perf_counter()
+            try:
+                await llm.query_llm(query, {**chunks, query: [query]})
+                return "ok", time.perf_counter() - start
+            except llm.LLMOverloadedError:
+                return "rejected", time.perf_counter() - start
+
+        results = await asyncio.gather(*(timed(f"consulta {i}") for i in range(burst)))
+        accepted = [elapsed for status, elapsed in results if status == "ok"]
+        rejected = [elapsed for status, elapsed in results if status == "rejected"]
+        distinct_requests = first.requests + second.requests
+
+        await asyncio.gather(*(llm.query_llm("misma consulta", chunks) for _ in range(burst)))
+        coalesced_requests = first.requests + second.requests - distinct_requests
+
+        stats = llm.gateway.stats()
+        await llm.close()
+
+    return {
+        "burst": burst,
+        "max_concurrency": concurrency,
+        "max_queue": queue,
+        "accepted": summarize(accepted),
+        "rejected": summarize(rejected),
+        "identical_burst_upstream_requests": coalesced_requests,
+        "requests_per_endpoint": [endpoint["requests"] for endpoint in stats["endpoints"]],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=8)
+    parser.add_argument("--llm-delay", type=float, default=0.5)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.burst, args.concurrency, args.queue, args.llm_delay))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Regresión: 1.000 consultas seguidas a query_llm deben enviar siempre el mismo
+tamaño de prompt y no degradar la latencia.
+
+    cd backend && PYTHONPATH=src python -m benchmarks.prompt_regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any
+
+from benchmarks.stubs import FakeOllama, summarize
+
+CHUNKS = {
+    f"0x{w:040x}": [f"Propuesta {c} sobre educación y vivienda." for c in range(3)]
+    for w in range(5)
+}
+
+
+async def run(requests: int, window: int) -> dict[str, Any]:
+    os.environ.setdefault("MYSQL_URL", "sqlite+aiosqlite://")
+    async with FakeOllama(delay=0) as fake_llm:
+        os.environ["LLM_URL"] = fake_llm.url
+
+        from backend.core.config import settings
+        from backend.services import llm
+
+        template_messages = len(settings.LLM_SETTINGS["messages"])
+        await llm.connect()
+        latencies: list[float] = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            await llm.query_llm("educación", CHUNKS)
+            latencies.append(time.perf_counter() - start)
+        await llm.close()
+        sizes = fake_llm.body_sizes
+
+    first = statistics.mean(latencies[:window])
+    last = statistics.mean(latencies[-window:])
+    return {
+        "requests": requests,
+        "prompt_bytes_min": min(sizes),
+        "prompt_bytes_max": max(sizes),
+        "template_messages_before": template_messages,
+        "template_messages_after": len(settings.LLM_SETTINGS["messages"]),
+        "first_window_mean_ms": round(first * 1000, 3),
+        "last_window_mean_ms": round(last * 1000, 3),
+        "latency": summarize(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=100)
+    parser.add_argument("--max-slowdown", type=float, default=1.5)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.requests, args.window))
+    print(json.dumps(result, indent=2))
+
+    errors = []
+    if result["prompt_bytes_min"] != result["prompt_bytes_max"]:
+        errors.append("prompt size grows between requests")
+    if result["template_messages_before"] != result["template_messages_after"]:
+        errors.append("LLM_SETTINGS template was mutated")
+    # Margen absoluto de 1 ms para no fallar por ruido en latencias muy pequeñas
+    allowed = result["first_window_mean_ms"] * args.max_slowdown + 1
+    if result["last_window_mean_ms"] > allowed:
+        errors.append("latency degrades across consecutive requests")
+    if errors:
+        sys.exit("REGRESSION: " + "; ".join(errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Compara la recuperación plana (top_k global) con la agrupada por wallet sobre
+una colección sintética de 1.000 programas, algunos de ellos muy extensos.
+
+    cd backend && PYTHONPATH=src python -m benchmarks.retrieval_grouped
+    cd backend && PYTHONPATH=src python -m benchmarks.retrieval_grouped --qdrant http://localhost:6333
+
+Las latencias con ":memory:" miden la implementación local del cliente, que
+agrupa en Python; para comparar latencias reales hay que usar un servidor.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from benchmarks.stubs import summarize
+
+COLLECTION = "bench_program_chunks"
+
+
+def build_corpus(
+    wallets: int,
+    chunks: int,
+    verbose_wallets: int,
+    verbose_chunks: int,
+    dim: int,
+    rng: np.random.Generator,
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    # Los programas extensos se concentran en los temas más consultados
+    topics = rng.normal(size=(16, dim))
+    owners: list[str] = []
+    vectors: list[np.ndarray] = []
+    for w in range(wallets):
+        address = f"0x{w:040x}"
+        count = verbose_chunks if w < verbose_wallets else chunks
+        topic = topics[rng.integers(len(topics), size=count)]
+        noise = 1.0 if w < verbose_wallets else 2.0
+        vectors.append(topic + rng.normal(scale=noise, size=(count, dim)))
+        owners.extend([address] * count)
+    matrix = np.vstack(vectors).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return owners, matrix, topics
+
+
+async def load(client: AsyncQdrantClient, owners: list[str], matrix: np.ndarray) -> None:
+    if await client.collection_exists(COLLECTION):
+        await client.delete_collection(COLLECTION)
+    await client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=VectorParams(size=matrix.shape[1], distance=Distance.COSINE),
+    )
+    for start in range(0, len(owners), 2000):
+        await client.upsert(
+            collection_name=COLLECTION,
+            points=[
+                PointStruct(
+                    id=i,
+                    vector=matrix[i].tolist(),
+                    payload={"wallet_address": owners[i], "text": f"fragmento {i}"},
+                )
+                for i in range(start, min(start + 2000, len(owners)))
+            ],
+        )
+
+
+def ideal_wallets(owners: list[str], matrix: np.ndarray, query: np.ndarray, n: int) -> set[str]:
+    best: dict[str, float] = {}
+    for owner, score in zip(owners, matrix @ query, strict=True):
+        if score > best.get(owner, -2.0):
+            best[owner] = float(score)
+    return set(sorted(best, key=best.__getitem__, reverse=True)[:n])
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    os.environ.setdefault("MYSQL_URL", "sqlite+aiosqlite://")
+    os.environ["QDRANT_URL"] = args.qdrant
+    os.environ["QDRANT_COLLECTION"] = COLLECTION
+
+    from backend.services import qdrant
+
+    rng = np.random.default_rng(0)
+    owners, matrix, topics = build_corpus(
+        args.wallets, args.chunks, args.verbose_wallets, args.verbose_chunks, args.dim, rng
+    )
+    await qdrant.connect()
+    client = qdrant.get_client()
+    await load(client, owners, matrix)
+
+    queries = topics[rng.integers(len(topics), size=args.queries)]
+    queries = queries + rng.normal(scale=1.0, size=queries.shape)
+    modes: dict[str, Any] = {
+        "flat_top5": lambda q: _flat(client, q, 5),
+        f"flat_top{args.groups * args.group_size}": lambda q: _flat(
+            client, q, args.groups * args.group_size
+        ),
+        "grouped": lambda q: qdrant.get_grouped_chunks(q, args.groups, args.group_size),
+    }
+
+    report: dict[str, Any] = {
+        "points": len(owners),
+        "wallets": args.wallets,
+        "queries": args.queries,
+        "groups": args.groups,
+        "group_size": args.group_size,
+    }
+    for name, search in modes.items():
+        latencies: list[float] = []
+        recall: list[float] = []
+        distinct: list[int] = []
+        for query in queries:
+            expected = ideal_wallets(owners, matrix, query, args.groups)
+            start = time.perf_counter()
+            result = await search(query.tolist())
+            latencies.append(time.perf_counter() - start)
+            recall.append(len(expected & set(result)) / len(expected))
+            distinct.append(len(result))
+        report[name] = {
+            "latency": summarize(latencies),
+            "wallet_recall": round(float(np.mean(recall)), 4),
+            "distinct_wallets": round(float(np.mean(distinct)), 2),
+        }
+
+    await client.delete_collection(COLLECTION)
+    await qdrant.close()
+    return report
+
+
+async def _flat(client: AsyncQdrantClient, query: list[float], top_k: int) -> dict[str, list[str]]:
+    hits = (await client.query_points(collection_name=COLLECTION, query=query, limit=top_k)).points
+    grouped: dict[str, list[str]] = {}
+    for hit in hits:
+        if hit.payload:
+            grouped.setdefault(hit.payload["wallet_address"], []).append(hit.payload["text"])
+    return grouped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qdrant", default=":memory:")
+    parser.add_argument("--wallets", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--verbose-wallets", type=int, default=20)
+    parser.add_argument("--verbose-chunks", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--group-size", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+from collections.abc import AsyncIterator
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples: list[float], elapsed: float | None = None) -> dict[str, Any]:
+    summary: dict[str, Any] = {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+    if elapsed:
+        summary["rps"] = round(len(samples) / elapsed, 2)
+    return summary
+
+
+class FakeOllama:
+    def __init__(
+        self,
+        delay: float = 1.0,
+        tokens: int = 20,
+        wallets: list[str] | None = None,
+    ) -> None:
+        self.delay = delay
+        self.tokens = tokens
+        self.wallets = wallets or ["0x0000000000000000000000000000000000000001"]
+        self.requests = 0
+        self.body_sizes: list[int] = []
+        self.url = ""
+        self._server: uvicorn.Server | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def _answer(self) -> list[str]:
+        words = [f"palabra{i} " for i in range(self.tokens)]
+        return [*words, "\nWALLETS=", json.dumps(self.wallets)]
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/api/tags")
+        async def tags() -> dict[str, Any]:
+            return {"models": [{"name": "fake"}]}
+
+        @app.post("/api/chat")
+        async def chat(request: Request) -> Any:
+            self.requests += 1
+            raw = await request.body()
+            self.body_sizes.append(len(raw))
+            body = json.loads(raw)
+            if not body.get("stream"):
+                await asyncio.sleep(self.delay)
+                content = "".join(self._answer())
+                return JSONResponse(
+                    {"message": {"role": "assistant", "content": content}, "done": True}
+                )
+
+            async def stream() -> AsyncIterator[bytes]:
+                pieces = self._answer()
+                for piece in pieces:
+                    await asyncio.sleep(self.delay / len(pieces))
+                    line = {"message": {"role": "assistant", "content": piece}, "done": False}
+                    yield (json.dumps(line) + "\n").encode()
+                yield (json.dumps({"message": {"content": ""}, "done": True}) + "\n").encode()
+
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+        return app
+
+    async def __aenter__(self) -> FakeOllama:
+        config = uvicorn.Config(self.app(), host="127.0.0.1", port=0, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            await asyncio.sleep(0.01)
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/api/chat"
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        if self._server is not None and self._task is not None:
+            self._server.should_exit = True
+            await self._task
+
+
+def random_vector(dim: int, rng: random.Random) -> list[float]:
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+async def seed_chunks(
+    client: AsyncQdrantClient,
+    collection: str,
+    wallets: int,
+    chunks_per_wallet: int,
+    dim: int = 384,
+    seed: int = 0,
+) -> list[str]:
+    rng = random.Random(seed)
+    if await client.collection_exists(collection):
+        await client.delete_collection(collection)
+    await client.create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+    )
+    addresses = [f"0x{i:040x}" for i in range(wallets)]
+    points = [
+        PointStruct(
+            id=w * chunks_per_wallet + c,
+            vector=random_vector(dim, rng),
+            payload={
+                "wallet_address": address,
+                "filename": "main",
+                "chunk_id": c,
+                "text": f"Propuesta {c} del programa de {address}. " * 5,
+            },
+        )
+        for w, address in enumerate(addresses)
+        for c in range(chunks_per_wallet)
+    ]
+    for start in range(0, len(points), 1000):
+        await client.upsert(collection_name=collection, points=points[start : start + 1000])
+    return addresses
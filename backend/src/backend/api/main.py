@@ -1,9 +1,10 @@
 from fastapi import APIRouter
 
-from backend.api.routes import chat, files, program, wallet
+from backend.api.routes import chat, files, metrics, program, wallet
 
 api_router = APIRouter()
 api_router.include_router(files.router)
 api_router.include_router(wallet.router)
 api_router.include_router(program.router)
 api_router.include_router(chat.router)
+api_router.include_router(metrics.router)
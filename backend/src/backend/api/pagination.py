@@ -0,0 +1,63 @@
+import base64
+import binascii
+import json
+from collections.abc import AsyncIterator, Iterable
+from typing import Any, Literal
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Modo exportación: en lugar de una página se envía el listado completo por
+# bloques, como NDJSON (un objeto por línea) o como un único array JSON
+ListStream = Literal["ndjson", "json"]
+
+
+def encode_cursor(*values: str) -> str:
+    # Cursor opaco: la clave de ordenación del último elemento devuelto
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[str]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(isinstance(value, str) for value in values)
+    ):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def page_response(items: list[dict[str, Any]], next_cursor: str | None) -> JSONResponse:
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(status_code=HTTP_200_OK, content=items, headers=headers)
+
+
+async def _ndjson(items: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    async for item in items:
+        yield json.dumps(item) + "\n"
+
+
+async def _json_array(items: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    separator = "["
+    async for item in items:
+        yield separator + json.dumps(item)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def stream_response(items: AsyncIterator[dict[str, Any]], stream: ListStream) -> StreamingResponse:
+    if stream == "ndjson":
+        return StreamingResponse(_ndjson(items), media_type="application/x-ndjson")
+    return StreamingResponse(_json_array(items), media_type="application/json")
+
+
+async def iterate(items: Iterable[dict[str, Any]]) -> AsyncIterator[dict[str, Any]]:
+    for item in items:
+        yield item
@@ -1,17 +1,25 @@
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
 
-from backend.services.llm import query_llm
+from backend.services.answer_cache import answer_cache
+from backend.services.history import conversations
+from backend.services.llm import LLMOverloadedError, gateway, query_llm, stream_llm
 from backend.services.qdrant import get_similar_chunks
 
-router = APIRouter()
-
 router = APIRouter(tags=["chat"])
 
 
 class ChatRequest(BaseModel):
     message: str
     embedding: list[float]
+    session_id: str | None = None
 
 
 class ChatResponse(BaseModel):
@@ -19,20 +27,136 @@ class ChatResponse(BaseModel):
     matched_wallets: list[str] = []
 
 
+def overloaded(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+        detail="LLM is overloaded, retry later",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest) -> ChatResponse:
+    # Las conversaciones con historial dependen de los turnos previos: no se cachean
+    use_cache = not request.session_id
+    cached = answer_cache.lookup(request.embedding) if use_cache else None
+    if cached is not None:
+        return ChatResponse(
+            reply=cached.reply,
+            matched_wallets=cached.matched_wallets,
+        )
+
     try:
-        grouped_chunks = get_similar_chunks(request.embedding)
+        generation = answer_cache.generation
+        grouped_chunks = await get_similar_chunks(request.embedding)
 
-        reply, matched_wallets = query_llm(request.message, grouped_chunks)
+        history = conversations.get(request.session_id) if request.session_id else []
+        reply, matched_wallets = await query_llm(request.message, grouped_chunks, history)
+        if request.session_id:
+            conversations.append(request.session_id, request.message, reply)
+        elif use_cache:
+            answer_cache.store(
+                request.embedding,
+                reply,
+                matched_wallets,
+                wallets=grouped_chunks.keys(),
+                generation=generation,
+            )
 
         return ChatResponse(
             reply=reply,
             matched_wallets=matched_wallets,
         )
 
+    except LLMOverloadedError as e:
+        raise overloaded(e.retry_after) from e
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=str(e),
         ) from e
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream", response_class=StreamingResponse)
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+    use_cache = not request.session_id
+    cached = answer_cache.lookup(request.embedding) if use_cache else None
+    if cached is not None:
+
+        async def cached_events() -> AsyncIterator[str]:
+            yield sse_event("token", {"content": cached.reply})
+            yield sse_event("wallets", {"matched_wallets": cached.matched_wallets})
+            yield sse_event("done", {})
+
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers=headers)
+
+    # Admisión antes de responder: si no hay plaza el cliente recibe un 503 con
+    # Retry-After en lugar de un 200 seguido de un evento de error
+    try:
+        await gateway.acquire()
+    except LLMOverloadedError as e:
+        raise overloaded(e.retry_after) from e
+
+    released = False
+
+    def release() -> None:
+        # Se llama al acabar el stream y como tarea de fondo, por si el
+        # cliente se desconecta antes de que empiece
+        nonlocal released
+        if not released:
+            released = True
+            gateway.release()
+
+    try:
+        generation = answer_cache.generation
+        grouped_chunks = await get_similar_chunks(request.embedding)
+    except Exception as e:
+        release()
+        raise HTTPException(
+            status_code=500,
+            detail=str(e),
+        ) from e
+
+    history = conversations.get(request.session_id) if request.session_id else []
+
+    async def events() -> AsyncIterator[str]:
+        reply = ""
+        matched_wallets: list[str] = []
+        try:
+            async for kind, value in stream_llm(request.message, grouped_chunks, history):
+                if kind == "token":
+                    reply += value
+                    yield sse_event("token", {"content": value})
+                else:
+                    matched_wallets = value
+                    yield sse_event("wallets", {"matched_wallets": value})
+            if request.session_id:
+                conversations.append(request.session_id, request.message, reply.strip())
+            elif use_cache:
+                answer_cache.store(
+                    request.embedding,
+                    reply.strip(),
+                    matched_wallets,
+                    wallets=grouped_chunks.keys(),
+                    generation=generation,
+                )
+            yield sse_event("done", {})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers=headers,
+        background=BackgroundTask(release),
+    )
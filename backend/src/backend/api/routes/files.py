@@ -1,9 +1,29 @@
-from typing import Any
-
-from fastapi import APIRouter, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
-from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_404_NOT_FOUND
+from datetime import datetime
+from typing import Annotated, Any
+
+from fastapi import APIRouter, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_201_CREATED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+)
 
+from backend.api.pagination import (
+    ListStream,
+    decode_cursor,
+    encode_cursor,
+    page_response,
+    stream_response,
+)
+from backend.core.config import settings
+from backend.core.db import SessionDep
 from backend.models.uploadedfile import UploadedFile
 from backend.services import database, storage
 from backend.services.rabbitmq import send_message
@@ -15,10 +35,11 @@ router = APIRouter(tags=["files"])
 @router.post("/{wallet_address}/file", response_class=PlainTextResponse)
 async def upload_file(
     wallet_address: str,
+    session: SessionDep,
     file: UploadFile = File(...),  # noqa: B008
 ) -> PlainTextResponse:
-    file_uploaded: UploadedFile = storage.upload(file, wallet_address)
-    await database.add(file_uploaded)
+    file_uploaded: UploadedFile = await storage.upload(file, wallet_address)
+    await database.add(file_uploaded, session=session)
     await send_message(
         {
             "add": [
@@ -40,25 +61,52 @@ async def upload_file(
 @router.get("/{wallet_address}/file", response_class=JSONResponse)
 async def get_files(
     wallet_address: str,
-) -> JSONResponse:
-    files = await database.read_all(wallet_address)
-    return JSONResponse(
-        status_code=HTTP_200_OK,
-        content=[file.to_dict() for file in files if file.filename != "main"],
-    )
+    session: SessionDep,
+    limit: Annotated[int | None, Query(ge=1, le=settings.LIST_MAX_PAGE_SIZE)] = None,
+    cursor: str | None = None,
+    stream: ListStream | None = None,
+) -> Response:
+    # La paginación es opcional: sin limit ni cursor se devuelve la lista
+    # completa, como antes
+    paginate = limit is not None or cursor is not None
+    limit = limit or settings.LIST_PAGE_SIZE
+    after = None
+    if cursor:
+        created_at, filename = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(created_at), filename)
+        except ValueError as e:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+
+    if stream is not None:
+        files = database.iter_files(wallet_address, limit, after)
+        return stream_response((file.to_dict() async for file in files), stream)
+
+    if not paginate:
+        files = await database.read_page(wallet_address, None, session=session)
+        return page_response([file.to_dict() for file in files], None)
+
+    # Se pide una fila de más para saber si hay página siguiente
+    files = await database.read_page(wallet_address, limit + 1, after, session=session)
+    next_cursor = None
+    if len(files) > limit:
+        last = files[limit - 1]
+        next_cursor = encode_cursor(last.created_at.isoformat(), last.filename)
+    return page_response([file.to_dict() for file in files[:limit]], next_cursor)
 
 
 @router.get("/{wallet_address}/file/{fileid}", response_class=JSONResponse)
 async def get_file(
     wallet_address: str,
     fileid: str,
+    session: SessionDep,
 ) -> JSONResponse:
     if fileid == "main":
         raise HTTPException(
             status_code=HTTP_404_NOT_FOUND,
             detail="File not found",
         )
-    file = await database.read(wallet_address, fileid)
+    file = await database.read(wallet_address, fileid, session=session)
     return JSONResponse(
         status_code=HTTP_200_OK,
         content=file.to_dict(),
@@ -72,34 +120,37 @@ async def get_file(
 async def download_file(
     wallet_address: str,
     filename: str,
-) -> FileResponse:
+    request: Request,
+    session: SessionDep,
+) -> Response:
     if filename == "main":
         raise HTTPException(
             status_code=HTTP_404_NOT_FOUND,
             detail="File not found",
         )
 
-    try:
-        file: FileResponse = storage.get(filename, wallet_address)
-    except Exception as e:
-        raise HTTPException(
-            status_code=HTTP_404_NOT_FOUND,
-            detail="File not found",
-        ) from e
-
-    return file
+    file = await database.find(wallet_address, filename, session=session) or storage.describe(
+        wallet_address, filename
+    )
+    return storage.get(file, request)
 
 
 @router.get(
     "/{wallet_address}/file/{filename}/base64",
-    response_class=PlainTextResponse,
+    response_class=StreamingResponse,
 )
-async def get_file_base64(wallet_address: str, filename: str) -> PlainTextResponse:
+async def get_file_base64(
+    wallet_address: str,
+    filename: str,
+    session: SessionDep,
+) -> StreamingResponse:
+    file = await database.find(wallet_address, filename, session=session) or storage.describe(
+        wallet_address, filename
+    )
     try:
-        return PlainTextResponse(
-            content=storage.get_base64(filename, wallet_address),
-        )
-
+        return storage.get_base64(file)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -111,10 +162,14 @@ async def get_file_base64(wallet_address: str, filename: str) -> PlainTextRespon
 @router.delete("/{wallet_address}/file", response_class=JSONResponse)
 async def delete_files(
     wallet_address: str,
+    session: SessionDep,
 ) -> JSONResponse:
     try:
         files = list(
-            set(await database.remove_all(wallet_address) + storage.delete_all(wallet_address))
+            set(
+                await database.remove_all(wallet_address, session=session)
+                + storage.delete_all(wallet_address)
+            )
         )
         content: list[dict[str, Any]] = [file.to_dict() for file in files]
         await send_message(
@@ -141,6 +196,7 @@ async def delete_files(
 async def delete_file(
     wallet_address: str,
     fileid: str,
+    session: SessionDep,
 ) -> JSONResponse:
     if fileid == "main":
         raise HTTPException(
@@ -150,7 +206,7 @@ async def delete_file(
     try:
         files = list(
             set(
-                await database.remove(wallet_address, fileid)
+                await database.remove(wallet_address, fileid, session=session)
                 + storage.delete(fileid, wallet_address)
             )
         )
@@ -0,0 +1,26 @@
+from typing import Any
+
+from fastapi import APIRouter
+
+from backend.core.db import pool_stats
+from backend.services import llm
+from backend.services.answer_cache import answer_cache
+from backend.services.rabbitmq import publisher
+from backend.services.wallets_cache import wallets_cache
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics() -> dict[str, Any]:
+    return {
+        "rabbitmq": publisher.stats(),
+        "llm": {
+            "time_to_first_token": llm.ttft.snapshot(),
+            "stream_duration": llm.stream_duration.snapshot(),
+            "gateway": llm.gateway.stats(),
+        },
+        "answer_cache": answer_cache.stats(),
+        "wallets_cache": wallets_cache.stats(),
+        "db_pool": pool_stats(),
+    }
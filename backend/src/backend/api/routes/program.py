@@ -1,6 +1,6 @@
 from typing import Any
 
-from fastapi import APIRouter, File, Form, HTTPException, Response, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Request, Response, UploadFile
 from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.status import (
     HTTP_200_OK,
@@ -9,6 +9,7 @@ from starlette.status import (
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
 
+from backend.core.db import SessionDep
 from backend.models.uploadedfile import UploadedFile
 from backend.services import database, storage
 from backend.services.rabbitmq import send_message
@@ -20,12 +21,13 @@ router = APIRouter(tags=["programs"])
 @router.post("/{wallet_address}/program", response_class=PlainTextResponse)
 async def program(
     wallet_address: str,
+    session: SessionDep,
     file: UploadFile = File(...),  # noqa: B008
     overwrite: bool = Form(False),
 ) -> PlainTextResponse:
     try:
-        uploaded_file: UploadedFile = storage.upload_main(file, wallet_address, overwrite)
-        await database.add(uploaded_file, overwrite=overwrite)
+        uploaded_file: UploadedFile = await storage.upload_main(file, wallet_address, overwrite)
+        await database.add(uploaded_file, overwrite=overwrite, session=session)
         await send_message(
             {
                 "add": [
@@ -41,6 +43,9 @@ async def program(
             status_code=HTTP_201_CREATED,
         )
 
+    except HTTPException:
+        # 409 si ya existe y no se sobrescribe, 413 si supera MAX_UPLOAD_SIZE
+        raise
     except Exception as err:
         if not overwrite:
             raise HTTPException(
@@ -55,19 +60,23 @@ async def program(
 
 #   Read
 @router.get("/{wallet_address}/program", response_class=Response)
-async def read_program(wallet_address: str) -> Response:
-    file = storage.get("main", wallet_address)
-    with open(file.path, "rb") as f:
-        return Response(content=f.read(), media_type="application/octet-stream")
+async def read_program(wallet_address: str, request: Request, session: SessionDep) -> Response:
+    file = await database.find(wallet_address, "main", session=session) or storage.describe(
+        wallet_address, "main"
+    )
+    return storage.get(file, request)
 
 
 #  Delete
 @router.delete("/{wallet_address}/program", response_class=JSONResponse)
-async def delete_program(wallet_address: str) -> JSONResponse:
+async def delete_program(wallet_address: str, session: SessionDep) -> JSONResponse:
     files = []
     try:
         files = list(
-            set(await database.remove_program(wallet_address) + storage.delete_main(wallet_address))
+            set(
+                await database.remove_program(wallet_address, session=session)
+                + storage.delete_main(wallet_address)
+            )
         )
     except Exception as e:
         print("================>", e)
@@ -1,9 +1,21 @@
-from typing import Any
+from bisect import bisect_right
+from itertools import islice
+from typing import Annotated, Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Response
 from fastapi.responses import JSONResponse
 from starlette.status import HTTP_200_OK
 
+from backend.api.pagination import (
+    ListStream,
+    decode_cursor,
+    encode_cursor,
+    iterate,
+    page_response,
+    stream_response,
+)
+from backend.core.config import settings
+from backend.core.db import SessionDep
 from backend.models.uploadedfile import UploadedFile
 from backend.services import database, storage
 from backend.services.rabbitmq import send_message
@@ -13,15 +25,39 @@ router = APIRouter(tags=["wallet"])
 
 #   Read
 @router.get("/wallets", response_class=JSONResponse)
-async def list_wallets() -> JSONResponse:
-    return JSONResponse(content=await database.read_wallets())
+async def list_wallets(
+    limit: Annotated[int | None, Query(ge=1, le=settings.LIST_MAX_PAGE_SIZE)] = None,
+    cursor: str | None = None,
+    stream: ListStream | None = None,
+) -> Response:
+    # El listado completo ya está en memoria y ordenado por wallet_address:
+    # la página empieza justo después del wallet del cursor
+    wallets = await database.read_wallets()
+    start = 0
+    if cursor:
+        (after,) = decode_cursor(cursor, 1)
+        start = bisect_right(wallets, after, key=lambda wallet: wallet["wallet_address"])
+
+    if stream is not None:
+        return stream_response(iterate(islice(wallets, start, None)), stream)
+
+    # Sin limit ni cursor, la lista completa
+    if limit is None and cursor is None:
+        return page_response(wallets, None)
+
+    limit = limit or settings.LIST_PAGE_SIZE
+    page = wallets[start : start + limit]
+    next_cursor = None
+    if start + limit < len(wallets):
+        next_cursor = encode_cursor(page[-1]["wallet_address"])
+    return page_response(page, next_cursor)
 
 
 #   Delete
 @router.delete("/{wallet_address}", response_class=JSONResponse)
-async def delete_wallet(wallet_address: str) -> JSONResponse:
+async def delete_wallet(wallet_address: str, session: SessionDep) -> JSONResponse:
     try:
-        await database.remove_wallet(wallet_address)
+        await database.remove_wallet(wallet_address, session=session)
     except Exception:
         pass
     files: list[UploadedFile] = []
@@ -1,17 +1,83 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from typing import Annotated, Any
 
+from fastapi import Depends
+from sqlalchemy import Connection, event, insert, inspect, make_url, select, text
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection, QueuePool
+from sqlalchemy.sql.functions import count
 from sqlmodel import SQLModel
 
 from backend.core.config import settings
+from backend.core.metrics import LatencyRecorder
+from backend.models.uploadedfile import UploadedFile
+from backend.models.walletstats import WalletStats
+
+# Tiempo que tarda cada petición en obtener una conexión del pool (incluye
+# abrirla si hace falta); los errores son timeouts de checkout
+checkout_wait = LatencyRecorder()
+
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    def connect(self) -> PoolProxiedConnection:
+        with checkout_wait.time():
+            return super().connect()
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    database_url = make_url(url)
+    if database_url.get_backend_name() == "sqlite":
+        # En memoria hay una única conexión compartida (StaticPool); con un
+        # fichero local se mide el checkout pero no tiene sentido dimensionar
+        if database_url.database in (None, "", ":memory:"):
+            return {}
+        return {"poolclass": MeteredPool}
+    return {
+        "poolclass": MeteredPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        # MySQL cierra las conexiones inactivas (wait_timeout): se reciclan
+        # antes y pre_ping descarta las que murieron entre medias
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+engine: AsyncEngine = create_async_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    echo=False,
+    **engine_options(settings.SQLALCHEMY_DATABASE_URI),
+)
+
+_in_use = 0
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(*_: Any) -> None:
+    global _in_use
+    _in_use += 1
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(*_: Any) -> None:
+    global _in_use
+    _in_use -= 1
+
+
+def pool_stats() -> dict[str, Any]:
+    pool = engine.pool
+    stats: dict[str, Any] = {"in_use": _in_use, "checkout_wait": checkout_wait.snapshot()}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), idle=pool.checkedin(), overflow=max(0, pool.overflow()))
+    return stats
 
-engine: AsyncEngine = create_async_engine(settings.SQLALCHEMY_DATABASE_URI, echo=False)
 
 SessionLocal: async_sessionmaker[AsyncSession] = async_sessionmaker(
     bind=engine,
@@ -26,6 +92,75 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+@asynccontextmanager
+async def use_session(session: AsyncSession | None) -> AsyncGenerator[AsyncSession, None]:
+    # Reutiliza la sesión de la petición si la hay; si no, abre una propia
+    if session is not None:
+        try:
+            yield session
+        except BaseException:
+            # La sesión sigue usándose en la petición: no puede quedar a medias
+            await session.rollback()
+            raise
+        return
+    async with SessionLocal() as own_session:
+        yield own_session
+
+
+async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    # Dependencia de FastAPI: una sesión (y como mucho una conexión) por petición
+    async with SessionLocal() as session:
+        yield session
+
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+
+
+def add_missing_columns(connection: Connection) -> None:
+    # No hay migraciones: create_all no toca tablas existentes, así que las
+    # columnas nuevas (siempre nullables) se añaden aquí
+    inspector = inspect(connection)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                )
+                print(f"[+] Added column {table.name}.{column.name}")
+
+
+def add_missing_indexes(connection: Connection) -> None:
+    # create_all solo crea los índices de las tablas que crea
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def backfill_wallet_stats(connection: Connection) -> None:
+    # Los recuentos se mantienen en cada alta y baja; al crear la tabla se
+    # rellenan una vez a partir de los ficheros ya subidos
+    connection.execute(
+        insert(WalletStats).from_select(
+            ["wallet_address", "file_count"],
+            select(UploadedFile.wallet_address, count()).group_by(  # type: ignore[arg-type]
+                UploadedFile.wallet_address
+            ),
+        )
+    )
+    print("[+] Backfilled walletstats")
+
+
 async def init_db() -> None:
     async with engine.begin() as conn:
+        has_stats = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).has_table(WalletStats.__tablename__)
+        )
         await conn.run_sync(SQLModel.metadata.create_all)
+        if not has_stats:
+            await conn.run_sync(backfill_wallet_stats)
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(add_missing_indexes)
@@ -6,8 +6,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.routing import APIRoute
 
 from backend.api.main import api_router
+from backend.api.pagination import NEXT_CURSOR_HEADER
 from backend.core.config import settings
 from backend.core.db import init_db
+from backend.services import llm, qdrant
+from backend.services.answer_cache import answer_cache
+from backend.services.rabbitmq import publisher
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -28,21 +32,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 
+async def on_chunks_changed(event: dict[str, Any]) -> None:
+    # El worker avisa cuando indexa o borra fragmentos de una wallet
+    answer_cache.invalidate_wallets(event.get("wallets", []))
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[Any, Any]:
-    # Añadir aqui rabbitmq
     await init_db()
+    await publisher.start()
+    await publisher.subscribe(settings.RABBITMQ_EVENTS_EXCHANGE, on_chunks_changed)
+    await qdrant.connect()
+    await llm.connect()
     yield  # Aquí se ejecuta la app
-    # if channel:
-    #     await channel.close()
-    # if connection:
-    #     await connection.close()
-    # print("🛑 RabbitMQ connection closed")
+    await llm.close()
+    await qdrant.close()
+    await publisher.close()
 
 
 app.router.lifespan_context = lifespan
@@ -3,14 +3,23 @@ from __future__ import annotations
 from datetime import UTC, datetime
 from typing import Any
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class UploadedFile(SQLModel, table=True):
+    # La PK (filename, wallet_address) no sirve para filtrar por wallet: este
+    # índice cubre los listados, los borrados y el recuento por wallet
+    __table_args__ = (
+        Index("ix_uploadedfile_wallet_created", "wallet_address", "created_at", "filename"),
+    )
+
     filename: str = Field(primary_key=True)
     wallet_address: str = Field(primary_key=True)
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     mime_type: str = ""
+    content_hash: str | None = None
+    size: int | None = None
 
     def to_dict(self) -> dict[str, Any]:
         return {
@@ -18,6 +27,8 @@ class UploadedFile(SQLModel, table=True):
             "wallet_address": self.wallet_address,
             "created_at": self.created_at.isoformat(),
             "mime_type": self.mime_type,
+            "content_hash": self.content_hash,
+            "size": self.size,
         }
 
     def __hash__(self) -> int:
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from typing import Any
+
+from sqlmodel import Field, SQLModel
+
+
+class WalletStats(SQLModel, table=True):
+    # Recuento de ficheros por wallet mantenido en cada alta y baja, para que
+    # /wallets no tenga que agrupar toda la tabla de ficheros
+    wallet_address: str = Field(primary_key=True)
+    file_count: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "wallet_address": self.wallet_address,
+            "file_count": self.file_count,
+        }
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from backend.core.config import settings
+
+
+@dataclass
+class CachedAnswer:
+    reply: str
+    matched_wallets: list[str]
+    wallets: frozenset[str]
+    vector: np.ndarray
+    created_at: float
+    size: int
+
+
+class AnswerCache:
+    # Caché semántica de respuestas de /chat. La clave es el embedding
+    # normalizado y cuantizado; si no hay coincidencia exacta se busca la
+    # entrada más parecida por coseno por encima de un umbral.
+    def __init__(
+        self,
+        enabled: bool,
+        threshold: float,
+        ttl: float,
+        max_entries: int,
+        max_bytes: int,
+        levels: int,
+    ) -> None:
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.levels = levels
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._bytes = 0
+        self._entries: OrderedDict[bytes, CachedAnswer] = OrderedDict()
+        self._by_wallet: dict[str, set[bytes]] = {}
+        self._matrix: tuple[list[bytes], np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _normalize(self, embedding: list[float]) -> tuple[bytes, np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector = vector / norm
+        key = np.round(vector * self.levels).astype(np.int8).tobytes()
+        return key, vector
+
+    def lookup(self, embedding: list[float]) -> CachedAnswer | None:
+        if not self.enabled or not embedding:
+            return None
+        key, vector = self._normalize(embedding)
+        entry = self._entries.get(key)
+        if entry is None and self._entries:
+            keys, matrix = self._similarity_matrix()
+            if matrix.shape[1] == vector.shape[0]:
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if float(scores[best]) >= self.threshold:
+                    key = keys[best]
+                    entry = self._entries[key]
+        if entry is not None and time.monotonic() - entry.created_at > self.ttl:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(
+        self,
+        embedding: list[float],
+        reply: str,
+        matched_wallets: list[str],
+        wallets: Iterable[str],
+        generation: int,
+    ) -> None:
+        # Si hubo invalidaciones mientras se generaba la respuesta, puede estar obsoleta
+        if not self.enabled or not embedding or generation != self.generation:
+            return
+        key, vector = self._normalize(embedding)
+        if key in self._entries:
+            self._remove(key)
+        size = (
+            vector.nbytes
+            + sys.getsizeof(reply)
+            + sum(sys.getsizeof(wallet) for wallet in matched_wallets)
+        )
+        entry = CachedAnswer(
+            reply=reply,
+            matched_wallets=list(matched_wallets),
+            wallets=frozenset(wallets) | frozenset(matched_wallets),
+            vector=vector,
+            created_at=time.monotonic(),
+            size=size,
+        )
+        self._entries[key] = entry
+        self._bytes += size
+        for wallet in entry.wallets:
+            self._by_wallet.setdefault(wallet, set()).add(key)
+        self._matrix = None
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_wallets(self, wallets: Iterable[str]) -> int:
+        self.generation += 1
+        removed = 0
+        for wallet in set(wallets):
+            for key in list(self._by_wallet.get(wallet, ())):
+                self._remove(key)
+                removed += 1
+        self.invalidations += removed
+        return removed
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    def _similarity_matrix(self) -> tuple[list[bytes], np.ndarray]:
+        if self._matrix is None:
+            keys = list(self._entries)
+            self._matrix = (keys, np.stack([self._entries[key].vector for key in keys]))
+        return self._matrix
+
+    def _remove(self, key: bytes) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for wallet in entry.wallets:
+            keys = self._by_wallet.get(wallet)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_wallet[wallet]
+        self._matrix = None
+
+
+answer_cache = AnswerCache(
+    enabled=settings.ANSWER_CACHE_ENABLED,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    ttl=settings.ANSWER_CACHE_TTL,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=settings.ANSWER_CACHE_MAX_BYTES,
+    levels=settings.ANSWER_CACHE_QUANTIZATION,
+)
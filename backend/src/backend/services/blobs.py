@@ -0,0 +1,122 @@
+import fcntl
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from uuid import uuid4
+
+from backend.core.config import settings
+
+# Almacén direccionado por contenido: cada fichero subido se guarda una sola
+# vez en UPLOAD_DIR/.blobs/<ab>/<sha256> y las rutas de cada wallet son enlaces
+# simbólicos relativos a ese blob. Un fichero .refs junto al blob lleva la
+# cuenta de enlaces; el blob se borra cuando llega a cero.
+
+
+def blob_dir() -> str:
+    return os.path.join(settings.UPLOAD_DIR, ".blobs")
+
+
+def blob_path(content_hash: str) -> str:
+    return os.path.join(blob_dir(), content_hash[:2], content_hash)
+
+
+def base64_path(content_hash: str) -> str:
+    # Copia ya codificada en base64 del blob (sin la cabecera data:)
+    return blob_path(content_hash) + ".b64"
+
+
+@contextmanager
+def _locked() -> Iterator[None]:
+    # flock sobre un fichero común: excluye también a los otros procesos de uvicorn
+    os.makedirs(blob_dir(), exist_ok=True)
+    with open(os.path.join(blob_dir(), ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_refs(content_hash: str) -> int:
+    try:
+        with open(blob_path(content_hash) + ".refs") as f:
+            return int(f.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_refs(content_hash: str, refs: int) -> None:
+    path = blob_path(content_hash) + ".refs"
+    tmp_path = f"{path}.{uuid4().hex}"
+    with open(tmp_path, "w") as f:
+        f.write(str(refs))
+    os.replace(tmp_path, path)
+
+
+def _decref(content_hash: str) -> None:
+    refs = _read_refs(content_hash) - 1
+    if refs > 0:
+        _write_refs(content_hash, refs)
+        return
+    for path in (
+        blob_path(content_hash),
+        blob_path(content_hash) + ".refs",
+        base64_path(content_hash),
+    ):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    print(f"[🗑️] Removed blob {content_hash}")
+
+
+def linked_hash(path: str) -> str | None:
+    # Hash del blob al que apunta una ruta de wallet; None si es un fichero
+    # normal (subidas anteriores al almacén de blobs)
+    if not os.path.islink(path):
+        return None
+    target = os.path.realpath(path)
+    if os.path.dirname(os.path.dirname(target)) != os.path.realpath(blob_dir()):
+        return None
+    return os.path.basename(target)
+
+
+def store(tmp_path: str, content_hash: str, path: str) -> bool:
+    # Mueve el temporal al almacén (o lo descarta si el contenido ya estaba) y
+    # enlaza la ruta de la wallet. Devuelve True si el contenido ya existía.
+    with _locked():
+        blob = blob_path(content_hash)
+        deduplicated = os.path.exists(blob)
+        if deduplicated:
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(tmp_path, blob)
+        _write_refs(content_hash, _read_refs(content_hash) + 1)
+
+        previous = linked_hash(path)
+        link_path = f"{path}.{uuid4().hex}.link"
+        os.symlink(os.path.relpath(blob, os.path.dirname(path)), link_path)
+        # El enlace se sustituye de forma atómica: nadie ve la ruta vacía
+        os.replace(link_path, path)
+        if previous is not None:
+            _decref(previous)
+        return deduplicated
+
+
+def release(path: str) -> None:
+    with _locked():
+        content_hash = linked_hash(path)
+        os.remove(path)
+        if content_hash is not None:
+            _decref(content_hash)
+
+
+def store_base64(tmp_path: str, content_hash: str) -> None:
+    # Publica la copia en base64 solo si el blob sigue existiendo; si se borró
+    # mientras se codificaba, la copia se descarta
+    with _locked():
+        if os.path.exists(blob_path(content_hash)):
+            os.replace(tmp_path, base64_path(content_hash))
+        else:
+            os.remove(tmp_path)
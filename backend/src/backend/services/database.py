@@ -1,22 +1,58 @@
+from collections import Counter
+from collections.abc import AsyncIterator
 from datetime import UTC, datetime
+from typing import Any
 
 from fastapi import HTTPException
-from sqlalchemy import and_, update
-from sqlalchemy.sql import Select
-from sqlalchemy.sql.functions import count
-from sqlmodel import select
+from sqlalchemy import ColumnElement, Executable, and_, delete, or_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
 from starlette.status import HTTP_404_NOT_FOUND
 
-from backend.core.db import get_async_session
+from backend.core.db import engine, get_async_session, use_session
 from backend.models.uploadedfile import UploadedFile
+from backend.models.walletstats import WalletStats
+from backend.services.wallets_cache import wallets_cache
 
 
-async def add(file: UploadedFile, overwrite: bool = False) -> None:
-    async with get_async_session() as session:
-        if not overwrite:
-            session.add(file)
-        else:
-            await session.execute(
+def _count_files(deltas: dict[str, int]) -> Executable:
+    # Suma atómica sobre walletstats: INSERT ... ON CONFLICT / ON DUPLICATE KEY
+    rows = [{"wallet_address": w, "file_count": d} for w, d in deltas.items()]
+    if engine.dialect.name == "mysql":
+        mysql_stmt = mysql.insert(WalletStats).values(rows)
+        return mysql_stmt.on_duplicate_key_update(
+            file_count=WalletStats.file_count + mysql_stmt.inserted.file_count
+        )
+    insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(WalletStats).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["wallet_address"],
+        set_={"file_count": WalletStats.file_count + stmt.excluded.file_count},
+    )
+
+
+async def _update_counts(session: AsyncSession, files: list[UploadedFile], sign: int) -> None:
+    deltas = Counter(file.wallet_address for file in files)
+    if not deltas:
+        return
+    await session.execute(_count_files({w: sign * n for w, n in deltas.items()}))
+    if sign < 0:
+        await session.execute(
+            delete(WalletStats).where(
+                col(WalletStats.wallet_address).in_(deltas),
+                col(WalletStats.file_count) <= 0,
+            )
+        )
+
+
+async def add(
+    file: UploadedFile, overwrite: bool = False, session: AsyncSession | None = None
+) -> None:
+    async with use_session(session) as s:
+        inserted = not overwrite
+        if overwrite:
+            result = await s.execute(
                 update(UploadedFile)
                 .where(
                     and_(
@@ -26,102 +62,166 @@ async def add(file: UploadedFile, overwrite: bool = False) -> None:
                 )
                 .values(
                     mime_type=file.mime_type,
+                    content_hash=file.content_hash,
+                    size=file.size,
                     created_at=datetime.now(UTC),
                 )
             )
-        await session.commit()
-
-
-async def read_all(wallet_address: str) -> list[UploadedFile]:
-    async with get_async_session() as session:
-        stmt: Select = select(UploadedFile).where(
+            # Sobrescribir un fichero que no tenía fila la crea
+            inserted = result.rowcount == 0  # type: ignore[attr-defined]
+        if inserted:
+            s.add(file)
+            await _update_counts(s, [file], 1)
+        await s.commit()
+    if inserted:
+        wallets_cache.invalidate()
+
+
+async def read_page(
+    wallet_address: str,
+    limit: int | None,
+    after: tuple[datetime, str] | None = None,
+    session: AsyncSession | None = None,
+) -> list[UploadedFile]:
+    # Paginación por clave sobre (wallet_address, created_at, filename), que
+    # es justo el índice: cada página es un rango del índice, sin OFFSET
+    stmt = (
+        select(UploadedFile)
+        .where(
             UploadedFile.wallet_address == wallet_address,
+            UploadedFile.filename != "main",
         )
-        results = await session.execute(stmt)
-        return [file for (file,) in results.all()]
-
-
-async def read(wallet_address: str, fileid: str) -> UploadedFile:
-    async with get_async_session() as session:
-        file: UploadedFile | None = await session.get(UploadedFile, (fileid, wallet_address))
-        if not file:
-            raise HTTPException(
-                status_code=HTTP_404_NOT_FOUND,
-                detail="File not found",
+        .order_by(col(UploadedFile.created_at), col(UploadedFile.filename))
+        .limit(limit)
+    )
+    if after is not None:
+        created_at, filename = after
+        # Forma expandida de (created_at, filename) > after: MySQL no siempre
+        # usa el índice con comparaciones de tuplas
+        stmt = stmt.where(
+            or_(
+                col(UploadedFile.created_at) > created_at,
+                and_(
+                    col(UploadedFile.created_at) == created_at,
+                    col(UploadedFile.filename) > filename,
+                ),
             )
-        return file
+        )
+    async with use_session(session) as s:
+        result = await s.scalars(stmt)
+        return list(result.all())
+
+
+async def iter_files(
+    wallet_address: str,
+    page_size: int,
+    after: tuple[datetime, str] | None = None,
+) -> AsyncIterator[UploadedFile]:
+    # Recorre todos los ficheros de la wallet página a página: en memoria
+    # nunca hay más de page_size filas
+    while True:
+        files = await read_page(wallet_address, page_size, after)
+        for file in files:
+            yield file
+        if len(files) < page_size:
+            return
+        after = (files[-1].created_at, files[-1].filename)
+
+
+async def find(
+    wallet_address: str, fileid: str, session: AsyncSession | None = None
+) -> UploadedFile | None:
+    async with use_session(session) as s:
+        return await s.get(UploadedFile, (fileid, wallet_address))
+
+
+async def read(
+    wallet_address: str, fileid: str, session: AsyncSession | None = None
+) -> UploadedFile:
+    file = await find(wallet_address, fileid, session=session)
+    if not file:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="File not found",
+        )
+    return file
 
 
-async def read_wallets() -> list[dict[str, str | int]]:
+async def _read_wallets() -> list[dict[str, Any]]:
     async with get_async_session() as session:
-        stmt: Select = select(UploadedFile.wallet_address, count().label("file_count")).group_by(
-            UploadedFile.wallet_address
+        result = await session.scalars(select(WalletStats).where(col(WalletStats.file_count) > 0))
+        # Orden binario en Python: la collation de MySQL no distingue
+        # mayúsculas y el bisect de /wallets compara cadenas de Python
+        return sorted(
+            (stats.to_dict() for stats in result.all()),
+            key=lambda wallet: wallet["wallet_address"],
         )
-        result = await session.execute(stmt)
-        return [
-            {
-                "wallet_address": row[0],
-                "file_count": row[1],
-            }
-            for row in result.all()
-        ]
 
 
-async def remove_all(wallet_address: str) -> list[UploadedFile]:
-    async with get_async_session() as session:
-        stmt: Select = select(UploadedFile).where(
+async def read_wallets() -> list[dict[str, Any]]:
+    return await wallets_cache.get(_read_wallets)
+
+
+async def _delete(session: AsyncSession, *where: ColumnElement[bool]) -> list[UploadedFile]:
+    # Un único DELETE por conjunto; con RETURNING (sqlite, postgres, mariadb)
+    # las filas borradas vuelven en la misma sentencia, si no se leen antes
+    # dentro de la misma transacción. Las filas se cargan como entidades del
+    # ORM: construirlas con UploadedFile(...) valida campo a campo y cuesta
+    # más que el propio borrado
+    stmt = delete(UploadedFile).where(*where).execution_options(synchronize_session=False)
+    if engine.dialect.delete_returning:
+        result = await session.scalars(stmt.returning(UploadedFile))
+        files = list(result.all())
+    else:
+        result = await session.scalars(select(UploadedFile).where(*where).with_for_update())
+        files = list(result.all())
+        if files:
+            await session.execute(stmt)
+    await _update_counts(session, files, -1)
+    await session.commit()
+    if files:
+        wallets_cache.invalidate()
+    return files
+
+
+async def remove_all(
+    wallet_address: str, session: AsyncSession | None = None
+) -> list[UploadedFile]:
+    async with use_session(session) as s:
+        return await _delete(
+            s,
             UploadedFile.wallet_address == wallet_address,
             UploadedFile.filename != "main",
         )
-        result = await session.execute(stmt)
-        files = result.all()
-        for (file,) in files:
-            await session.delete(file)
-        await session.commit()
-        return [file for (file,) in files]
 
 
-async def remove(wallet_address: str, fileid: str) -> list[UploadedFile]:
-    async with get_async_session() as session:
-        stmt: Select = select(UploadedFile).where(
-            UploadedFile.wallet_address == wallet_address,
-            UploadedFile.filename != "main",
-        )
+async def remove(
+    wallet_address: str, fileid: str, session: AsyncSession | None = None
+) -> list[UploadedFile]:
+    async with use_session(session) as s:
+        where = [UploadedFile.wallet_address == wallet_address, UploadedFile.filename != "main"]
         if fileid:
-            stmt = stmt.where(UploadedFile.filename == fileid)
-
-        result = await session.execute(stmt)
-        files = result.all()
-        for (file,) in files:
-            await session.delete(file)
-        await session.commit()
-        return [file for (file,) in files]
+            where.append(UploadedFile.filename == fileid)
+        return await _delete(s, *where)
 
 
-async def remove_program(wallet_address: str) -> list[UploadedFile]:
-    async with get_async_session() as session:
-        stmt: Select = select(UploadedFile).where(
+async def remove_program(
+    wallet_address: str, session: AsyncSession | None = None
+) -> list[UploadedFile]:
+    async with use_session(session) as s:
+        return await _delete(
+            s,
             UploadedFile.wallet_address == wallet_address,
             UploadedFile.filename == "main",
         )
 
-        result = await session.execute(stmt)
-        files = result.all()
-        for (file,) in files:
-            await session.delete(file)
-        await session.commit()
-        return [file for (file,) in files]
-
 
-async def remove_wallet(wallet_address: str) -> list[UploadedFile]:
-    async with get_async_session() as session:
-        stmt: Select = select(UploadedFile).where(
+async def remove_wallet(
+    wallet_address: str, session: AsyncSession | None = None
+) -> list[UploadedFile]:
+    async with use_session(session) as s:
+        return await _delete(
+            s,
             UploadedFile.wallet_address == wallet_address,
             UploadedFile.filename != "main",
         )
-        result = await session.execute(stmt)
-        files = result.all()
-        for (file,) in files:
-            await session.delete(file)
-        await session.commit()
-        return [file for (file,) in files]
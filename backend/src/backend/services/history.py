@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict, deque
+
+from backend.core.config import settings
+
+
+class ConversationHistory:
+    # Historial acotado por sesión: LRU por número de sesiones, TTL por
+    # inactividad y un máximo de turnos (pregunta + respuesta) por sesión.
+    def __init__(self, max_sessions: int, max_turns: int, ttl: float) -> None:
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, tuple[float, deque[dict[str, str]]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> list[dict[str, str]]:
+        self._expire()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return []
+        self._sessions[session_id] = (time.monotonic(), entry[1])
+        self._sessions.move_to_end(session_id)
+        return [dict(message) for message in entry[1]]
+
+    def append(self, session_id: str, user_message: str, assistant_message: str) -> None:
+        if self.max_turns <= 0 or self.max_sessions <= 0:
+            return
+        _, messages = self._sessions.pop(session_id, (0.0, deque(maxlen=self.max_turns * 2)))
+        messages.append({"role": "user", "content": user_message})
+        messages.append({"role": "assistant", "content": assistant_message})
+        self._sessions[session_id] = (time.monotonic(), messages)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def clear(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, (touched, _) = next(iter(self._sessions.items()))
+            if touched >= deadline:
+                break
+            del self._sessions[session_id]
+
+
+conversations = ConversationHistory(
+    max_sessions=settings.CHAT_HISTORY_MAX_SESSIONS,
+    max_turns=settings.CHAT_HISTORY_MAX_TURNS,
+    ttl=settings.CHAT_HISTORY_TTL,
+)
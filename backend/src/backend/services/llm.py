@@ -1,35 +1,227 @@
+import asyncio
+import hashlib
 import json
-import os
 import re
+import time
+from collections.abc import AsyncIterator, Mapping, Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urljoin
 
 import httpx
 
 from backend.core.config import settings
+from backend.core.metrics import LatencyRecorder
+from backend.services.prompt import format_prompt
 
-LLM_URL = os.getenv("LLM_URL", "http://llm:11434/api/chat")
-LLM_MODEL = os.getenv("LLM_MODEL", "llama2")
+WALLETS_MARKER = "WALLETS"
+WALLETS_PATTERN = re.compile(r"WALLETS\s*=\s*(\[.*?\])", re.DOTALL)
 
-# Limita el número de fragmentos por programa para no saturar el LLM
-MAX_CHUNKS_PER_WALLET = 3
+_http: httpx.AsyncClient | None = None
 
+ttft = LatencyRecorder()
+stream_duration = LatencyRecorder()
 
-def format_prompt(
-    user_query: str,
-    chunks_by_wallet: dict[str, list[str]],
-) -> str:
-    # prompt = f'Un ciudadano dijo: "{user_query}"\n\n'
-    prompt = "Aquí tienes extractos de programas electorales agrupados por "
-    "wallet:\n"
-
-    for wallet, texts in chunks_by_wallet.items():
-        prompt += f"\nPrograma de {wallet}:\n"
-        for text in texts[:MAX_CHUNKS_PER_WALLET]:
-            prompt += f"- {text.strip()}\n"
-
-    prompt += (
-        "\nResponde de forma clara qué programas se ajustan mejor al criterio " "del ciudadano. "
+
+class LLMOverloadedError(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("LLM is overloaded, retry later")
+        self.retry_after = retry_after
+
+
+@dataclass
+class LLMEndpoint:
+    url: str
+    healthy: bool = True
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+
+
+class LLMGateway:
+    # Control de admisión (concurrencia + cola acotada), coalescencia de
+    # prompts idénticos en vuelo y balanceo entre varios servidores Ollama
+    # eligiendo el sano con menos peticiones pendientes.
+    def __init__(
+        self,
+        urls: list[str],
+        max_concurrency: int,
+        max_queue: int,
+        retry_after: int,
+        health_path: str,
+        health_interval: float,
+    ) -> None:
+        self.endpoints = [LLMEndpoint(url) for url in urls]
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.latency = LatencyRecorder()
+        self.rejected = 0
+        self.coalesced = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._inflight: dict[str, asyncio.Task[dict[str, Any]]] = {}
+        self._health_task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def saturated(self) -> bool:
+        return self._active >= self.max_concurrency and self._waiting >= self.max_queue
+
+    async def acquire(self) -> None:
+        if self.saturated():
+            self.rejected += 1
+            raise LLMOverloadedError(self.retry_after)
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+
+    def release(self) -> None:
+        self._active -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def pick(self) -> LLMEndpoint:
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+        # Si todos están marcados como caídos se prueba igualmente con todos
+        return min(candidates or self.endpoints, key=lambda endpoint: endpoint.outstanding)
+
+    @asynccontextmanager
+    async def endpoint(self) -> AsyncIterator[LLMEndpoint]:
+        endpoint = self.pick()
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        try:
+            yield endpoint
+        except httpx.TransportError:
+            endpoint.failures += 1
+            endpoint.healthy = False
+            raise
+        finally:
+            endpoint.outstanding -= 1
+
+    async def chat(self, payload: dict[str, Any]) -> dict[str, Any]:
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._post(payload))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: si un cliente se desconecta no se cancela la respuesta del resto
+        return await asyncio.shield(task)
+
+    @asynccontextmanager
+    async def stream(self, payload: dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        # La plaza la reserva quien llama (acquire) antes de empezar a responder
+        async with self.endpoint() as endpoint:
+            async with get_http_client().stream("POST", endpoint.url, json=payload) as response:
+                response.raise_for_status()
+                yield response
+
+    async def _post(self, payload: dict[str, Any]) -> dict[str, Any]:
+        async with self.admit(), self.endpoint() as endpoint:
+            with self.latency.time():
+                response: httpx.Response = await get_http_client().post(endpoint.url, json=payload)
+                response.raise_for_status()
+                result: dict[str, Any] = response.json()
+                return result
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._check(endpoint) for endpoint in self.endpoints))
+            await asyncio.sleep(self.health_interval)
+
+    async def _check(self, endpoint: LLMEndpoint) -> None:
+        try:
+            response = await get_http_client().get(
+                urljoin(endpoint.url, self.health_path),
+                timeout=settings.LLM_CONNECT_TIMEOUT,
+            )
+            endpoint.healthy = response.status_code == 200
+        except httpx.HTTPError:
+            endpoint.healthy = False
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "latency": self.latency.snapshot(),
+            "endpoints": [
+                {
+                    "url": endpoint.url,
+                    "healthy": endpoint.healthy,
+                    "outstanding": endpoint.outstanding,
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                }
+                for endpoint in self.endpoints
+            ],
+        }
+
+
+gateway = LLMGateway(
+    urls=settings.llm_urls,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    retry_after=settings.LLM_RETRY_AFTER,
+    health_path=settings.LLM_HEALTH_PATH,
+    health_interval=settings.LLM_HEALTH_INTERVAL,
+)
+
+
+async def connect() -> None:
+    global _http
+    # Un único cliente con keep-alive compartido por todas las peticiones de /chat
+    _http = httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
     )
-    return prompt
+    gateway.start()
+
+
+async def close() -> None:
+    global _http
+    await gateway.close()
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    if _http is None:
+        raise RuntimeError("LLM HTTP client is not connected")
+    return _http
 
 
 def extract_wallets_from_response(text: str) -> tuple[str, list[str]]:
@@ -48,25 +240,129 @@ def extract_wallets_from_response(text: str) -> tuple[str, list[str]]:
     return cleaned_text.strip(), wallets
 
 
-def query_llm(user_query: str, chunks_by_wallet: dict[str, list[str]]) -> tuple[str, list[str]]:
-    prompt = format_prompt(user_query, chunks_by_wallet)
+class WalletsStreamParser:
+    # Separa de forma incremental el texto de la respuesta de la línea final
+    # WALLETS=[...], sin esperar a tener la respuesta completa.
+    def __init__(self) -> None:
+        self._pending = ""
+        self._tail: str | None = None
+        self._done = False
+        self.wallets: list[str] = []
 
-    json = settings.LLM_SETTINGS
-    json["messages"].append(
-        {
-            "role": "user",
-            "content": prompt,
-        }
-    )
+    def feed(self, text: str) -> str:
+        if self._done:
+            return text
+        if self._tail is not None:
+            self._tail += text
+            return self._parse_tail()
+
+        self._pending += text
+        index = self._pending.find(WALLETS_MARKER)
+        if index >= 0:
+            ready, self._tail = self._pending[:index], self._pending[index:]
+            self._pending = ""
+            return ready + self._parse_tail()
+
+        # Retiene un posible comienzo del marcador partido entre tokens
+        keep = 0
+        for size in range(min(len(WALLETS_MARKER) - 1, len(self._pending)), 0, -1):
+            if WALLETS_MARKER.startswith(self._pending[-size:]):
+                keep = size
+                break
+        ready = self._pending[: len(self._pending) - keep]
+        self._pending = self._pending[len(self._pending) - keep :]
+        return ready
+
+    def close(self) -> str:
+        rest = self._pending + (self._tail or "")
+        self._pending, self._tail = "", None
+        return rest
+
+    def _parse_tail(self) -> str:
+        assert self._tail is not None
+        tail = self._tail
+        match = WALLETS_PATTERN.match(tail)
+        if not match:
+            if re.match(r"WALLETS\s*(=\s*)?(\[[^\]]*)?$", tail):
+                return ""
+            # No es la línea de wallets: se devuelve como texto y se sigue buscando
+            self._tail = None
+            return WALLETS_MARKER + self.feed(tail[len(WALLETS_MARKER) :])
+        try:
+            self.wallets = json.loads(match.group(1))
+        except Exception:
+            self._tail = None
+            return WALLETS_MARKER + self.feed(tail[len(WALLETS_MARKER) :])
+        self._tail = None
+        self._done = True
+        return tail[match.end() :]
 
-    response: httpx.Response = httpx.post(
-        LLM_URL,
-        json=json,
-        timeout=120.0,
-    )
-    response.raise_for_status()
 
-    result_text = response.json()["message"]["content"]
+def build_llm_request(
+    prompt: str,
+    history: Sequence[Mapping[str, str]] = (),
+    stream: bool = False,
+) -> dict[str, Any]:
+    # Payload nuevo en cada llamada: la plantilla de settings nunca se modifica
+    template = settings.LLM_SETTINGS
+    return {
+        **template,
+        "model": settings.LLM_MODEL,
+        "messages": [
+            *(dict(message) for message in template["messages"]),
+            *(dict(message) for message in history),
+            {
+                "role": "user",
+                "content": prompt,
+            },
+        ],
+        "stream": stream,
+    }
+
+
+async def query_llm(
+    user_query: str,
+    chunks_by_wallet: dict[str, list[str]],
+    history: Sequence[Mapping[str, str]] = (),
+) -> tuple[str, list[str]]:
+    prompt = format_prompt(user_query, chunks_by_wallet)
+
+    result = await gateway.chat(build_llm_request(prompt, history))
+
+    result_text = result["message"]["content"]
     result_text, matched_wallets = extract_wallets_from_response(result_text)
 
     return result_text, matched_wallets
+
+
+async def stream_llm(
+    user_query: str,
+    chunks_by_wallet: dict[str, list[str]],
+    history: Sequence[Mapping[str, str]] = (),
+) -> AsyncIterator[tuple[str, Any]]:
+    prompt = format_prompt(user_query, chunks_by_wallet)
+    payload = build_llm_request(prompt, history, stream=True)
+
+    parser = WalletsStreamParser()
+    start = time.perf_counter()
+    first = True
+    with stream_duration.time():
+        async with gateway.stream(payload) as response:
+            # Ollama devuelve NDJSON: un objeto JSON por línea
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                text = parser.feed(chunk.get("message", {}).get("content", ""))
+                if text:
+                    if first:
+                        ttft.observe(time.perf_counter() - start)
+                        first = False
+                    yield "token", text
+                if chunk.get("done"):
+                    break
+
+    rest = parser.close()
+    if rest:
+        yield "token", rest
+    yield "wallets", parser.wallets
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import re
+from hashlib import blake2b
+
+from backend.core.config import settings
+
+# Limita el número de fragmentos por programa para no saturar el LLM
+MAX_CHUNKS_PER_WALLET = 3
+
+PROMPT_HEADER = "Aquí tienes extractos de programas electorales agrupados por wallet:\n"
+PROMPT_FOOTER = (
+    "\nResponde de forma clara qué programas se ajustan mejor al criterio del ciudadano. "
+)
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"\w+")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;:])\s+|\n+")
+SHINGLE_SIZE = 5
+
+
+def estimate_tokens(text: str) -> int:
+    # Aproximación sin tokenizador: los tokenizadores BPE parten de media las
+    # palabras en español en algo más de un token
+    return (len(TOKEN_PATTERN.findall(text)) * 4 + 2) // 3
+
+
+def shingles(text: str) -> set[int]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        words += [""] * (SHINGLE_SIZE - len(words))
+    return {
+        int.from_bytes(
+            blake2b(" ".join(words[i : i + SHINGLE_SIZE]).encode(), digest_size=8).digest(),
+            "big",
+        )
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def drop_near_duplicates(texts: list[str], threshold: float) -> list[str]:
+    kept: list[str] = []
+    seen: list[set[int]] = []
+    for text in texts:
+        current = shingles(text)
+        if any(len(current & other) / len(current | other) >= threshold for other in seen):
+            continue
+        kept.append(text)
+        seen.append(current)
+    return kept
+
+
+def trim_to_budget(text: str, query_terms: set[str], budget: int) -> str:
+    text = text.strip()
+    if estimate_tokens(text) <= budget:
+        return text
+
+    sentences = [s.strip() for s in SENTENCE_PATTERN.split(text) if s.strip()]
+    # Las frases con más términos de la consulta primero; a igualdad, las primeras
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(query_terms & set(WORD_PATTERN.findall(sentences[i].lower()))), i),
+    )
+    chosen: list[int] = []
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(sentences[i])
+        if used + cost <= budget:
+            chosen.append(i)
+            used += cost
+    if chosen:
+        return " ".join(sentences[i] for i in sorted(chosen))
+
+    # Ni una frase cabe entera: se corta la más relevante por palabras
+    words = sentences[ranked[0]].split() if sentences else []
+    piece: list[str] = []
+    for word in words:
+        if estimate_tokens(" ".join([*piece, word])) > budget:
+            break
+        piece.append(word)
+    return " ".join(piece)
+
+
+def select_chunks(
+    user_query: str,
+    chunks_by_wallet: dict[str, list[str]],
+    budget: int,
+) -> dict[str, list[str]]:
+    query_terms = set(WORD_PATTERN.findall(user_query.lower()))
+    pending = {
+        wallet: drop_near_duplicates(texts, settings.LLM_PROMPT_DUPLICATE_THRESHOLD)[
+            :MAX_CHUNKS_PER_WALLET
+        ]
+        for wallet, texts in chunks_by_wallet.items()
+    }
+    selected: dict[str, list[str]] = {wallet: [] for wallet in pending}
+    remaining = budget
+    active = [wallet for wallet, texts in pending.items() if texts]
+
+    # Reparto por rondas: en cada ronda cada wallet recibe a lo sumo un fragmento
+    # recortado a su parte del presupuesto que queda, así lo que no usa un
+    # programa corto se redistribuye entre los demás.
+    while active and remaining > 0:
+        share = max(remaining // len(active), 1)
+        still_active: list[str] = []
+        for wallet in active:
+            allowance = min(share, remaining) - estimate_tokens("- \n")
+            if allowance <= 0:
+                break
+            piece = trim_to_budget(pending[wallet].pop(0), query_terms, allowance)
+            if piece:
+                selected[wallet].append(piece)
+                remaining -= estimate_tokens(f"- {piece}\n")
+            if pending[wallet]:
+                still_active.append(wallet)
+        active = still_active
+    return {wallet: texts for wallet, texts in selected.items() if texts}
+
+
+def format_prompt(
+    user_query: str,
+    chunks_by_wallet: dict[str, list[str]],
+    budget: int | None = None,
+) -> str:
+    budget = settings.LLM_PROMPT_TOKEN_BUDGET if budget is None else budget
+    wallet_headers = sum(estimate_tokens(f"\nPrograma de {w}:\n") for w in chunks_by_wallet)
+    available = budget - estimate_tokens(PROMPT_HEADER + PROMPT_FOOTER) - wallet_headers
+
+    prompt = PROMPT_HEADER
+    for wallet, texts in select_chunks(user_query, chunks_by_wallet, available).items():
+        prompt += f"\nPrograma de {wallet}:\n"
+        for text in texts:
+            prompt += f"- {text}\n"
+
+    prompt += PROMPT_FOOTER
+    return prompt
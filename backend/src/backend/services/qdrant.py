@@ -2,19 +2,65 @@ from __future__ import annotations
 
 from typing import Any
 
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 
-client = QdrantClient(host="qdrant", port=6333)
+from backend.core.config import settings
 
+_client: AsyncQdrantClient | None = None
 
-def get_similar_chunks(embedding: list[float], top_k: int = 5) -> dict[str, list[str]]:
-    hits: list[Any] = client.search(
-        collection_name="program_chunks",
+
+async def connect() -> None:
+    global _client
+    _client = AsyncQdrantClient(location=settings.QDRANT_URL)
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_client() -> AsyncQdrantClient:
+    if _client is None:
+        raise RuntimeError("Qdrant client is not connected")
+    return _client
+
+
+async def get_similar_chunks(embedding: list[float], top_k: int = 5) -> dict[str, list[str]]:
+    if settings.QDRANT_RETRIEVAL_MODE == "grouped":
+        return await get_grouped_chunks(embedding)
+
+    hits: list[Any] = await get_client().search(
+        collection_name=settings.QDRANT_COLLECTION,
         query_vector=embedding,
         limit=top_k,
+        score_threshold=settings.QDRANT_SCORE_THRESHOLD,
     )
     grouped: dict[str, list[str]] = {}
     for hit in hits:
         wallet = hit.payload["wallet_address"]
         grouped.setdefault(wallet, []).append(hit.payload["text"])
     return grouped
+
+
+async def get_grouped_chunks(
+    embedding: list[float],
+    groups: int | None = None,
+    group_size: int | None = None,
+) -> dict[str, list[str]]:
+    # Una sola consulta devuelve los N mejores programas con sus M mejores
+    # fragmentos, así un programa muy extenso no acapara todos los resultados.
+    result = await get_client().query_points_groups(
+        collection_name=settings.QDRANT_COLLECTION,
+        query=embedding,
+        group_by="wallet_address",
+        limit=groups or settings.QDRANT_GROUP_LIMIT,
+        group_size=group_size or settings.QDRANT_GROUP_SIZE,
+        score_threshold=settings.QDRANT_SCORE_THRESHOLD,
+        with_payload=["text"],
+    )
+    return {
+        str(group.id): [hit.payload["text"] for hit in group.hits if hit.payload]
+        for group in result.groups
+    }
@@ -1,28 +1,126 @@
+import asyncio
 import datetime
+import hashlib
 import os
+import threading
 from base64 import b64encode
+from collections.abc import Iterator
+from contextlib import ExitStack
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
-from shutil import copyfileobj
+from typing import Any, BinaryIO
 from uuid import uuid4
 
 import magic
-from fastapi import HTTPException, UploadFile
-from fastapi.responses import FileResponse
-from starlette.status import HTTP_404_NOT_FOUND, HTTP_409_CONFLICT
+from fastapi import HTTPException, Request, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.status import (
+    HTTP_304_NOT_MODIFIED,
+    HTTP_404_NOT_FOUND,
+    HTTP_409_CONFLICT,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+)
 
 from backend.core.config import settings
 from backend.models.uploadedfile import UploadedFile
+from backend.services import blobs
+
+_magic = magic.Magic(mime=True)
+# libmagic no es thread-safe: una sola instancia compartida, protegida por un lock
+_magic_lock = threading.Lock()
 
 
 def detect_mime_type(file_path: str) -> str:
     try:
-        mime = magic.Magic(mime=True)
-        return mime.from_file(file_path)
+        with _magic_lock:
+            return str(_magic.from_file(file_path))
+    except Exception:
+        return "application/octet-stream"
+
+
+def sniff_mime_type(head: bytes) -> str:
+    try:
+        with _magic_lock:
+            return str(_magic.from_buffer(head))
     except Exception:
         return "application/octet-stream"
 
 
-def upload(file: UploadFile, wallet_address: str) -> UploadedFile:
+@dataclass
+class ReceivedFile:
+    path: str
+    content_hash: str
+    mime_type: str
+    size: int
+
+
+def _write_chunk(out: BinaryIO, digest: Any, chunk: bytes) -> None:
+    digest.update(chunk)
+    out.write(chunk)
+
+
+async def receive(file: UploadFile) -> ReceivedFile:
+    # Una sola pasada: se escribe por bloques fuera del event loop, calculando
+    # el SHA-256 y guardando la cabecera para detectar el MIME. Se escribe en
+    # un temporal que luego se mueve al almacén de blobs, así el worker nunca
+    # ve un fichero a medias.
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the maximum size of {settings.MAX_UPLOAD_SIZE} bytes",
+        )
+    tmp_dir = os.path.join(settings.UPLOAD_DIR, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid4().hex)
+    digest = hashlib.sha256()
+    head = bytearray()
+    size = 0
+    out = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        try:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the maximum size of {settings.MAX_UPLOAD_SIZE} bytes",
+                    )
+                if len(head) < settings.UPLOAD_SNIFF_BYTES:
+                    head += chunk[: settings.UPLOAD_SNIFF_BYTES - len(head)]
+                await asyncio.to_thread(_write_chunk, out, digest, chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+        mime_type = await asyncio.to_thread(sniff_mime_type, bytes(head))
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return ReceivedFile(
+        path=tmp_path,
+        content_hash=digest.hexdigest(),
+        mime_type=mime_type,
+        size=size,
+    )
+
+
+async def save(file: UploadFile, file_path: str) -> ReceivedFile:
+    received = await receive(file)
+    try:
+        deduplicated = await asyncio.to_thread(
+            blobs.store,
+            received.path,
+            received.content_hash,
+            file_path,
+        )
+    except BaseException:
+        Path(received.path).unlink(missing_ok=True)
+        raise
+    if deduplicated:
+        print(f"[+] Deduplicated {file_path} -> {received.content_hash}")
+    return received
+
+
+async def upload(file: UploadFile, wallet_address: str) -> UploadedFile:
     file_id = str(uuid4())
     filename: str = file_id + ("_" + file.filename if file.filename else "")
 
@@ -31,17 +129,18 @@ def upload(file: UploadFile, wallet_address: str) -> UploadedFile:
 
     file_path = os.path.join(user_dir, filename)
 
-    with open(file_path, "wb") as buffer:
-        copyfileobj(file.file, buffer)
+    received = await save(file, file_path)
     return UploadedFile(
         filename=filename,
         wallet_address=wallet_address,
-        mime_type=detect_mime_type(file_path),
-        created_at=datetime.datetime.fromtimestamp(Path(file_path).stat().st_ctime),
+        mime_type=received.mime_type,
+        content_hash=received.content_hash,
+        size=received.size,
+        created_at=datetime.datetime.now(datetime.UTC),
     )
 
 
-def upload_main(
+async def upload_main(
     file: UploadFile,
     wallet_address: str,
     overwrite: bool = True,
@@ -60,42 +159,149 @@ def upload_main(
             detail="A program file already exists for this wallet.",
         )
 
-    with open(file_path, "wb") as buffer:
-        copyfileobj(file.file, buffer)
+    received = await save(file, file_path)
     return UploadedFile(
         filename=filename,
         wallet_address=wallet_address,
-        mime_type=detect_mime_type(file_path),
-        created_at=datetime.datetime.fromtimestamp(Path(file_path).stat().st_ctime),
+        mime_type=received.mime_type,
+        content_hash=received.content_hash,
+        size=received.size,
+        created_at=datetime.datetime.now(datetime.UTC),
     )
 
 
-def get(filename: str, wallet_address: str) -> FileResponse:
+def describe(wallet_address: str, filename: str) -> UploadedFile:
+    # Ficheros sin fila en la base de datos (programas guardados con overwrite
+    # cuando add solo hacía UPDATE): los metadatos salen del disco
     file_path = os.path.join(settings.UPLOAD_DIR, wallet_address, filename)
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="File not found",
+        ) from e
+    return UploadedFile(
+        filename=filename,
+        wallet_address=wallet_address,
+        mime_type=detect_mime_type(file_path),
+        content_hash=blobs.linked_hash(file_path),
+        size=stat_result.st_size,
+        created_at=datetime.datetime.fromtimestamp(stat_result.st_mtime, datetime.UTC),
+    )
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match usa comparación débil: W/"x" y "x" son equivalentes
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
 
-    if not os.path.exists(file_path):
+
+def get(file: UploadedFile, request: Request) -> Response:
+    # Los metadatos salen de la base de datos (sin libmagic) y el fichero se
+    # envía por bloques con FileResponse, que ya resuelve Range e If-Range
+    file_path = os.path.join(settings.UPLOAD_DIR, file.wallet_address, file.filename)
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError as e:
         raise HTTPException(
             status_code=HTTP_404_NOT_FOUND,
             detail="File not found",
-        )
+        ) from e
 
-    return FileResponse(path=file_path, media_type=detect_mime_type(file_path))
+    if file.content_hash:
+        etag = f'"{file.content_hash}"'
+    else:
+        # Ficheros anteriores a content_hash: ETag débil a partir de stat
+        etag = f'W/"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    # no-cache: el navegador guarda la copia pero revalida siempre, así un
+    # programa sobrescrito se ve al momento y el resto se queda en 304
+    headers = {"etag": etag, "last-modified": last_modified, "cache-control": "no-cache"}
 
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    not_modified = False
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+            not_modified = int(stat_result.st_mtime) <= since
+        except (TypeError, ValueError):
+            pass
+    if not_modified:
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
 
-def get_base64(filename: str, wallet_address: str) -> str:
-    file_path = os.path.join(settings.UPLOAD_DIR, wallet_address, filename)
+    return FileResponse(
+        path=file_path,
+        media_type=file.mime_type or "application/octet-stream",
+        headers=headers,
+        stat_result=stat_result,
+    )
+
+
+def _base64_blocks(file_path: str, cache_hash: str | None) -> Iterator[bytes]:
+    # Bloques múltiplos de 3 bytes: cada uno se codifica sin relleno intermedio
+    # y la concatenación es idéntica a codificar el fichero entero
+    block_size = max(3, settings.BASE64_BLOCK_SIZE - settings.BASE64_BLOCK_SIZE % 3)
+    with ExitStack() as stack:
+        f = stack.enter_context(open(file_path, "rb"))
+        cache: BinaryIO | None = None
+        tmp_path = ""
+        if cache_hash is not None:
+            tmp_path = f"{blobs.base64_path(cache_hash)}.{uuid4().hex}.tmp"
+            # Cliente desconectado o error: no queda una copia a medias. Si se
+            # llegó a publicar, el temporal ya no existe
+            stack.callback(Path(tmp_path).unlink, missing_ok=True)
+            cache = stack.enter_context(open(tmp_path, "wb"))
+        while block := f.read(block_size):
+            encoded = b64encode(block)
+            if cache is not None:
+                cache.write(encoded)
+            yield encoded
+        if cache is not None and cache_hash is not None:
+            cache.close()
+            blobs.store_base64(tmp_path, cache_hash)
+
+
+def _cached_blocks(cache_path: str) -> Iterator[bytes]:
+    with open(cache_path, "rb") as f:
+        while block := f.read(settings.BASE64_BLOCK_SIZE):
+            yield block
 
-    if not os.path.exists(file_path):
+
+def get_base64(file: UploadedFile) -> StreamingResponse:
+    file_path = os.path.join(settings.UPLOAD_DIR, file.wallet_address, file.filename)
+    try:
+        size = os.stat(file_path).st_size
+    except FileNotFoundError as e:
         raise HTTPException(
             status_code=HTTP_404_NOT_FOUND,
             detail="File not found",
-        )
+        ) from e
 
-    with open(file_path, "rb") as f:
-        encoded = b64encode(f.read()).decode("utf-8")
+    prefix = f"data:{file.mime_type or 'application/octet-stream'};base64,".encode()
+    content_hash = blobs.linked_hash(file_path) if settings.BASE64_CACHE_ENABLED else None
+    blocks: Iterator[bytes]
+    if content_hash is not None and os.path.exists(blobs.base64_path(content_hash)):
+        blocks = _cached_blocks(blobs.base64_path(content_hash))
+    else:
+        blocks = _base64_blocks(file_path, content_hash)
 
-    data_url = f"data:{detect_mime_type(file_path)};base64,{encoded}"
-    return data_url
+    def data_url() -> Iterator[bytes]:
+        yield prefix
+        yield from blocks
+
+    # StreamingResponse consume los iteradores síncronos en el threadpool, así
+    # que la lectura y la codificación no bloquean el bucle de eventos
+    return StreamingResponse(
+        data_url(),
+        media_type="text/plain",
+        headers={"content-length": str(len(prefix) + 4 * ((size + 2) // 3))},
+    )
 
 
 def delete_all(wallet_address: str) -> list[UploadedFile]:
@@ -103,7 +309,8 @@ def delete_all(wallet_address: str) -> list[UploadedFile]:
     folder = Path(folder_path)
     files: list[UploadedFile] = []
     for path in folder.iterdir():
-        if path.is_file():
+        # is_file sigue el enlace: un enlace a un blob que ya no existe también se borra
+        if path.is_file() or path.is_symlink():
             if path.name == "main":
                 continue
             file_path = os.path.join(folder_path, path.name)
@@ -111,15 +318,10 @@ def delete_all(wallet_address: str) -> list[UploadedFile]:
                 filename=path.name,
                 wallet_address=wallet_address,
                 mime_type=detect_mime_type(file_path),
-                created_at=datetime.datetime.fromtimestamp(path.stat().st_ctime),
+                created_at=datetime.datetime.fromtimestamp(path.lstat().st_ctime),
             )
             files.append(upload)
-            os.remove(
-                os.path.join(
-                    folder_path,
-                    path.name,
-                )
-            )
+            blobs.release(file_path)
     folder_path = os.path.join(settings.UPLOAD_DIR, wallet_address)
     try:
         os.rmdir(folder_path)
@@ -133,7 +335,7 @@ def delete(fileid: str, wallet_address: str) -> list[UploadedFile]:
         return []
     folder_path = os.path.join(settings.UPLOAD_DIR, wallet_address, fileid)
     time = datetime.datetime.fromtimestamp(Path(folder_path).stat().st_ctime)
-    os.remove(folder_path)
+    blobs.release(folder_path)
     upload = UploadedFile(
         filename=fileid,
         wallet_address=wallet_address,
@@ -153,7 +355,7 @@ def delete(fileid: str, wallet_address: str) -> list[UploadedFile]:
 def delete_main(wallet_address: str) -> list[UploadedFile]:
     folder_path = os.path.join(settings.UPLOAD_DIR, wallet_address, "main")
     time = datetime.datetime.fromtimestamp(Path(folder_path).stat().st_ctime)
-    os.remove(folder_path)
+    blobs.release(folder_path)
     upload = UploadedFile(
         filename="main",
         wallet_address=wallet_address,
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from backend.core.config import settings
+
+
+class WalletsCache:
+    # Caché en memoria del listado de /wallets. Las escrituras de este proceso
+    # la invalidan al momento; el TTL corto acota cuánto tardan en verse las
+    # hechas por otros procesos de uvicorn.
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._wallets: list[dict[str, Any]] | None = None
+        self._loaded_at = 0.0
+        # Una carga que empezó antes de una invalidación no se guarda
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> list[dict[str, Any]] | None:
+        if self._wallets is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._wallets
+        return None
+
+    async def get(
+        self, load: Callable[[], Awaitable[list[dict[str, Any]]]]
+    ) -> list[dict[str, Any]]:
+        wallets = self._fresh()
+        if wallets is not None:
+            self.hits += 1
+            return wallets
+        # Una sola carga a la vez: las peticiones simultáneas esperan su resultado
+        async with self._lock:
+            wallets = self._fresh()
+            if wallets is not None:
+                self.hits += 1
+                return wallets
+            self.misses += 1
+            generation = self._generation
+            wallets = await load()
+            if generation == self._generation:
+                self._wallets = wallets
+                self._loaded_at = time.monotonic()
+            return wallets
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._wallets = None
+        self.invalidations += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "wallets": len(self._wallets) if self._wallets is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+wallets_cache = WalletsCache(ttl=settings.WALLETS_CACHE_TTL)
@@ -21,6 +21,60 @@ export async function queryChat(
   return res.json();
 }
 
+export async function streamChat(
+  embedding: number[],
+  onToken: (token: string) => void,
+): Promise<ChatResponse> {
+  const res = await fetch(
+    `${import.meta.env["VITE_BACKEND_URL"]}/chat/stream`,
+    {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        message: "Hola",
+        embedding: embedding,
+      }),
+    },
+  );
+  if (!res.ok || !res.body) {
+    throw new Error(`Chat stream failed: ${res.status}`);
+  }
+
+  const result: ChatResponse = { reply: "", matched_wallets: [] };
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    // Cada evento SSE termina con una línea en blanco
+    let end = buffer.indexOf("\n\n");
+    while (end >= 0) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      end = buffer.indexOf("\n\n");
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+      if (event === "token") {
+        result.reply += payload.content;
+        onToken(payload.content);
+      } else if (event === "wallets") {
+        result.matched_wallets = payload.matched_wallets;
+      } else if (event === "error") {
+        throw new Error(payload.detail);
+      }
+    }
+  }
+  result.reply = result.reply.trim();
+  return result;
+}
+
 type WorkerInitiate = { status: "initiate" };
 type WorkerLoading = { status: "loading"; progress: unknown };
 type WorkerComplete = { status: "complete"; embedding: number[] };
@@ -0,0 +1,19 @@
+// Recorre todas las páginas de /{address}/file siguiendo la cabecera
+// X-Next-Cursor hasta que el backend deja de enviarla
+export async function fetchAllFiles<T>(address: string): Promise<T[]> {
+  const base = `${import.meta.env["VITE_BACKEND_URL"]}/${address}/file`;
+  const files: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const url: string = cursor
+      ? `${base}?cursor=${encodeURIComponent(cursor)}`
+      : base;
+    const res = await fetch(url);
+    if (!res.ok) {
+      throw new Error(`File list failed: ${res.status}`);
+    }
+    files.push(...((await res.json()) as T[]));
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return files;
+}
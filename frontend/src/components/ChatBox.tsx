@@ -8,7 +8,7 @@ import {
 import "../assets/chatbox.css";
 import { useDemocracyContract } from "../hooks/useDemocracyContract";
 import {
-  queryChat,
+  streamChat,
   type ChatResponse,
   type WorkerMessage,
 } from "../api/chat";
@@ -81,11 +81,21 @@ export default function ChatBox({
         case "complete":
           try {
             const embedding = e.data.embedding;
-            const res: ChatResponse = await queryChat(embedding);
-            const botReply = `🤖 ${res.reply}`;
-
-            // ✅ Actualización funcional (evita closures obsoletos)
-            setMessages((prev) => [...prev, botReply]);
+            // ✅ La respuesta se va pintando token a token
+            setMessages((prev) => [...prev, "🤖 "]);
+            const res: ChatResponse = await streamChat(
+              embedding,
+              (token) => {
+                setMessages((prev) => [
+                  ...prev.slice(0, -1),
+                  prev[prev.length - 1] + token,
+                ]);
+              },
+            );
+            setMessages((prev) => [
+              ...prev.slice(0, -1),
+              `🤖 ${res.reply}`,
+            ]);
             setResponse(res);
             if (Array.isArray(res.matched_wallets)) {
               onMatchedWallets?.(res.matched_wallets);
@@ -3,6 +3,7 @@ import StarterKit from "@tiptap/starter-kit";
 import TextAlign from "@tiptap/extension-text-align";
 import Image from "@tiptap/extension-image";
 import { ResizableImage } from "../components/ResizableImage";
+import { fetchAllFiles } from "../api/files";
 import "../assets/TiptapEditor.css";
 
 import { useAccount } from "wagmi";
@@ -127,13 +128,12 @@ export default function TiptapEditor() {
   const loadFileList = useCallback(async () => {
     if (!address) return;
     try {
-      const res = await fetch(`${BACKEND_URL}/${address}/file`);
-      const data = (await res.json()) as FileJSONInput[];
+      const data = await fetchAllFiles<FileJSONInput>(address);
       setFiles(data.map((d) => new FileJSON(d)));
     } catch (err) {
       console.error("Error al cargar archivos:", err);
     }
-  }, [BACKEND_URL, address]);
+  }, [address]);
 
   const handleSave = useCallback(async () => {
     if (!editor || !address) return;
@@ -208,8 +208,7 @@ export default function TiptapEditor() {
   const toggleSidebar = async () => {
     if (!showSidebar) {
       try {
-        const res = await fetch(`${BACKEND_URL}/${address}/file`);
-        const fileList = (await res.json()) as FileJSONInput[];
+        const fileList = await fetchAllFiles<FileJSONInput>(address);
         setFiles(fileList.map((d) => new FileJSON(d)));
       } catch (err) {
         console.error("Error fetching files:", err);
@@ -0,0 +1,106 @@
+"""
+Rendimiento del chunker por frases frente a las ventanas fijas de 300 palabras
+de antes: MB/s, chunks, tokens por chunk (cuántos superan la ventana del
+modelo) y pico de memoria al alimentar el documento página a página.
+
+    cd worker && PYTHONPATH=src python -m benchmarks.chunker
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from worker.services.chunk_text import Chunker, get_tokenizer
+
+WORDS = (
+    "el la los programa propuesta educación sanidad vivienda empleo transporte energía "
+    "cultura impuestos seguridad ambiente agricultura pensiones juventud municipio"
+).split()
+
+
+def make_pages(pages: int, paragraphs: int, seed: int = 7) -> Iterator[str]:
+    rng = random.Random(seed)
+    for _ in range(pages):
+        yield "\n\n".join(
+            " ".join(
+                " ".join(rng.choices(WORDS, k=rng.randint(6, 30))).capitalize() + "."
+                for _ in range(rng.randint(2, 7))
+            )
+            for _ in range(paragraphs)
+        )
+
+
+def legacy(pages: Iterable[str]) -> Iterator[str]:
+    words = "\n\n".join(pages).split()
+    for i in range(0, len(words), 300):
+        yield " ".join(words[i : i + 300])
+
+
+def streaming(pages: Iterable[str], max_tokens: int, overlap: int) -> Iterator[str]:
+    tokenizer, window = get_tokenizer()
+    chunker = Chunker(tokenizer, min(max_tokens, window), overlap)
+    for page in pages:
+        yield from chunker.feed(page)
+    yield from chunker.close()
+
+
+def measure(
+    name: str,
+    chunks: Callable[[Iterable[str]], Iterator[str]],
+    pages: int,
+    paragraphs: int,
+    window: int,
+) -> dict[str, Any]:
+    size = sum(len(page.encode()) for page in make_pages(pages, paragraphs))
+    tokenizer, _ = get_tokenizer()
+    start = time.perf_counter()
+    produced = list(chunks(make_pages(pages, paragraphs)))
+    elapsed = time.perf_counter() - start
+    # Segunda pasada solo para memoria: tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    for _ in chunks(make_pages(pages, paragraphs)):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tokens = sorted(tokenizer.count(chunk) for chunk in produced)
+    return {
+        "chunker": name,
+        "mb_per_s": round(size / elapsed / 2**20, 2),
+        "chunks": len(produced),
+        "tokens_p50": tokens[len(tokens) // 2],
+        "tokens_max": tokens[-1],
+        "over_window": sum(count > window for count in tokens),
+        "peak_mib": round(peak / 2**20, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--paragraphs", type=int, default=6)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap", type=int, default=32)
+    args = parser.parse_args()
+    _, window = get_tokenizer()
+    window = min(window, args.max_tokens)
+    report = [
+        measure("legacy", legacy, args.pages, args.paragraphs, window),
+        measure(
+            "sentence",
+            lambda pages: streaming(pages, args.max_tokens, args.overlap),
+            args.pages,
+            args.paragraphs,
+            window,
+        ),
+    ]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Compara chunks/segundo al codificar una ráfaga de ficheros pequeños fichero a
+fichero (una llamada a model.encode por fichero) frente al micro-batcher que
+junta chunks de varios ficheros en cada llamada.
+
+    cd worker && PYTHONPATH=src python -m benchmarks.embedding_batcher
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from worker.services.batcher import EmbeddingBatcher
+from worker.services.processor import embed, get_model
+
+WORDS = (
+    "educación sanidad vivienda empleo transporte energía cultura deporte impuestos "
+    "seguridad medio ambiente agricultura turismo digitalización pensiones juventud"
+).split()
+
+
+def make_files(files: int, chunks_per_file: int, words: int) -> list[list[str]]:
+    rng = random.Random(7)
+    return [
+        [" ".join(rng.choices(WORDS, k=words)) for _ in range(chunks_per_file)]
+        for _ in range(files)
+    ]
+
+
+async def per_file(corpus: list[list[str]], executor: ThreadPoolExecutor) -> float:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    await asyncio.gather(*(loop.run_in_executor(executor, embed, chunks) for chunks in corpus))
+    return time.perf_counter() - start
+
+
+async def batched(
+    corpus: list[list[str]],
+    executor: ThreadPoolExecutor,
+    batch_size: int,
+    max_wait: float,
+) -> tuple[float, dict[str, Any]]:
+    batcher = EmbeddingBatcher(batch_size, max_wait, workers=1)
+    batcher.start(executor)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(batcher.embed(chunks) for chunks in corpus))
+    elapsed = time.perf_counter() - start
+    await batcher.close()
+    assert [len(vectors) for vectors in results] == [len(chunks) for chunks in corpus]
+    return elapsed, batcher.stats()
+
+
+async def run(
+    files: int,
+    chunks_per_file: int,
+    words: int,
+    batch_size: int,
+    max_wait: float,
+) -> dict[str, Any]:
+    corpus = make_files(files, chunks_per_file, words)
+    total = files * chunks_per_file
+    get_model()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Calentamiento para no medir la primera inferencia
+        await asyncio.get_running_loop().run_in_executor(executor, embed, corpus[0])
+        per_file_elapsed = await per_file(corpus, executor)
+        batched_elapsed, stats = await batched(corpus, executor, batch_size, max_wait)
+
+    return {
+        "files": files,
+        "chunks": total,
+        "per_file_chunks_per_s": round(total / per_file_elapsed, 1),
+        "batched_chunks_per_s": round(total / batched_elapsed, 1),
+        "speedup": round(per_file_elapsed / batched_elapsed, 2),
+        "batch_size": stats["batch_size"],
+        "wait_ms": stats["wait_ms"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--chunks-per-file", type=int, default=2)
+    parser.add_argument("--words", type=int, default=120)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-wait", type=float, default=0.01)
+    args = parser.parse_args()
+    report = asyncio.run(
+        run(args.files, args.chunks_per_file, args.words, args.batch_size, args.max_wait)
+    )
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Sequence
+from typing import Any
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> float:
+        # Cota superior del bucket que contiene el percentil
+        if not self.count:
+            return 0.0
+        target = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts, strict=False):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict[str, Any]:
+        labels = [f"<={bound:g}" for bound in self.buckets] + [f">{self.buckets[-1]:g}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "buckets": dict(zip(labels, self.counts, strict=True)),
+        }
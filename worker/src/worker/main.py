@@ -1,11 +1,43 @@
 import asyncio
 import json
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any
 
 import aio_pika
-from aio_pika.abc import AbstractIncomingMessage, AbstractRobustConnection
+from aio_pika.abc import (
+    AbstractExchange,
+    AbstractIncomingMessage,
+    AbstractRobustConnection,
+)
 
-from worker.core.config import RABBITMQ_QUEUE, RABBITMQ_URL
-from worker.services.processor import delete_file_vectors, process_file
+from worker.core.config import (
+    EMBED_BATCH_MAX_WAIT,
+    EMBED_BATCH_SIZE,
+    INGEST_EMBED_THREADS,
+    INGEST_EXTRACT_PROCESSES,
+    INGEST_QUEUE_SIZE,
+    INGEST_STATS_INTERVAL,
+    INGEST_UPSERT_TASKS,
+    RABBITMQ_EVENTS_EXCHANGE,
+    RABBITMQ_QUEUE,
+    RABBITMQ_URL,
+    WORKER_PREFETCH,
+)
+from worker.services.ingestion import IngestionEngine
+from worker.services.processor import delete_wallet_files
+
+events_exchange: AbstractExchange | None = None
+stats_task: asyncio.Task[None] | None = None
+engine = IngestionEngine(
+    extract_workers=INGEST_EXTRACT_PROCESSES,
+    embed_workers=INGEST_EMBED_THREADS,
+    upsert_workers=INGEST_UPSERT_TASKS,
+    queue_size=INGEST_QUEUE_SIZE,
+    batch_size=EMBED_BATCH_SIZE,
+    batch_max_wait=EMBED_BATCH_MAX_WAIT,
+)
+_file_locks: dict[tuple[str, str], tuple[asyncio.Lock, int]] = {}
 
 
 async def wait_for_rabbitmq(
@@ -21,29 +53,113 @@ async def wait_for_rabbitmq(
     raise RuntimeError("RabbitMQ is not available after retries.")
 
 
+@asynccontextmanager
+async def file_lock(file: dict[str, Any]) -> AsyncIterator[None]:
+    # Con varios mensajes en vuelo, las operaciones sobre un mismo fichero
+    # (p. ej. sobrescribir el programa y luego borrarlo) se aplican en orden
+    key = (file["wallet_address"], file["filename"])
+    lock, users = _file_locks.get(key, (asyncio.Lock(), 0))
+    _file_locks[key] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _file_locks[key]
+        if users == 1:
+            del _file_locks[key]
+        else:
+            _file_locks[key] = (lock, users - 1)
+
+
+async def report_stats(interval: float) -> None:
+    # Colas del pipeline, lotes de embedding, conversores ODF y tiempos por página de PDF
+    while True:
+        await asyncio.sleep(interval)
+        print(f"[📊] Ingestion stats {json.dumps(engine.stats())}")
+
+
+async def ingest(file: dict[str, Any]) -> int:
+    async with file_lock(file):
+        return await engine.ingest(file)
+
+
+async def remove_files(items: list[dict[str, Any]]) -> set[str]:
+    # DELETE /{wallet} manda un item por fichero: se agrupan por wallet y se
+    # borran con una sola llamada a Qdrant
+    by_wallet: dict[str, set[str]] = {}
+    for item in items:
+        by_wallet.setdefault(item["wallet_address"], set()).add(item["filename"])
+    wallets: set[str] = set()
+    for wallet, names in by_wallet.items():
+        filenames = sorted(names)
+        try:
+            async with AsyncExitStack() as stack:
+                # Orden fijo al tomar varios locks para no bloquearse con otro mensaje
+                for filename in filenames:
+                    await stack.enter_async_context(
+                        file_lock({"wallet_address": wallet, "filename": filename})
+                    )
+                await delete_wallet_files(wallet, filenames)
+            wallets.add(wallet)
+        except Exception as e:
+            print(f"[!] Error processing remove: {e}")
+    return wallets
+
+
+async def publish_chunks_changed(wallets: set[str]) -> None:
+    # Avisa al backend para que invalide las respuestas cacheadas de estas wallets
+    if events_exchange is None or not wallets:
+        return
+    try:
+        await events_exchange.publish(
+            aio_pika.Message(
+                body=json.dumps({"event": "chunks_changed", "wallets": sorted(wallets)}).encode(),
+                content_type="application/json",
+            ),
+            routing_key="",
+        )
+    except Exception as e:
+        print(f"[!] Error publishing chunks_changed event: {e}")
+
+
 async def on_message(message: AbstractIncomingMessage) -> None:
     async with message.process():
         payload = json.loads(message.body.decode())
         print(f"[📨] Mensaje recibido {payload}")
+        wallets: set[str] = set()
 
-        # Procesar adiciones
-        for item in payload.get("add", []):
-            try:
-                await process_file(json.dumps(item))
-            except Exception as e:
-                print(f"[!] Error processing add: {e}")
+        # Procesar adiciones: los ficheros del mensaje avanzan a la vez por el pipeline
+        adds = payload.get("add", [])
+        results = await asyncio.gather(
+            *(ingest(item["file"]) for item in adds),
+            return_exceptions=True,
+        )
+        for item, result in zip(adds, results, strict=True):
+            if isinstance(result, BaseException):
+                print(f"[!] Error processing add: {result}")
+            else:
+                wallets.add(item["file"]["wallet_address"])
 
         # Procesar eliminaciones
-        for item in payload.get("remove", []):
-            try:
-                delete_file_vectors(json.dumps(item))
-            except Exception as e:
-                print(f"[!] Error processing remove: {e}")
+        wallets |= await remove_files(payload.get("remove", []))
+
+        await publish_chunks_changed(wallets)
 
 
 async def main() -> None:
+    global events_exchange, stats_task
     connection = await wait_for_rabbitmq(RABBITMQ_URL)
     channel = await connection.channel()
+    # Varios mensajes en vuelo a la vez; aio-pika atiende cada uno en su propia tarea
+    await channel.set_qos(prefetch_count=WORKER_PREFETCH)
+    await engine.start()
+    if INGEST_STATS_INTERVAL > 0:
+        stats_task = asyncio.create_task(report_stats(INGEST_STATS_INTERVAL))
+    events_exchange = await channel.declare_exchange(
+        RABBITMQ_EVENTS_EXCHANGE,
+        aio_pika.ExchangeType.FANOUT,
+        durable=True,
+    )
     queue = await channel.declare_queue(RABBITMQ_QUEUE, durable=True)
     await queue.consume(on_message)
     print("[⏳] Esperando mensajes...")
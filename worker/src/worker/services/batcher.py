@@ -0,0 +1,141 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any
+
+from worker.core.metrics import Histogram
+from worker.services.processor import embed
+
+WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+@dataclass
+class EmbedRequest:
+    texts: list[str]
+    done: asyncio.Future[list[list[float]]]
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class EmbeddingBatcher:
+    # Micro-batching entre mensajes: junta los chunks de varios ficheros hasta
+    # max_batch_size o hasta que el más antiguo lleva max_wait esperando, los
+    # codifica en una sola llamada al modelo y devuelve a cada fichero lo suyo.
+    def __init__(self, max_batch_size: int, max_wait: float, workers: int) -> None:
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.chunks = 0
+        self.batch_size = Histogram(
+            [2**i for i in range(max_batch_size.bit_length()) if 2**i < max_batch_size]
+            + [max_batch_size]
+        )
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self._pending: asyncio.Queue[EmbedRequest] = asyncio.Queue()
+        self._carry: EmbedRequest | None = None
+        self._slots = asyncio.Semaphore(workers)
+        self._executor: Executor | None = None
+        self._collector: asyncio.Task[None] | None = None
+        self._in_flight: set[asyncio.Task[None]] = set()
+
+    def start(self, executor: Executor) -> None:
+        self._executor = executor
+        self._collector = asyncio.create_task(self._collect_loop())
+
+    async def close(self) -> None:
+        if self._collector is not None:
+            self._collector.cancel()
+            await asyncio.gather(self._collector, return_exceptions=True)
+            self._collector = None
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        if self._collector is None:
+            raise RuntimeError("Embedding batcher is not started")
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        # Un fichero más grande que un lote se reparte entre varios lotes
+        requests = [
+            EmbedRequest(texts=texts[i : i + self.max_batch_size], done=loop.create_future())
+            for i in range(0, len(texts), self.max_batch_size)
+        ]
+        for request in requests:
+            self._pending.put_nowait(request)
+        parts = await asyncio.gather(*(request.done for request in requests))
+        return [vector for part in parts for vector in part]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": self._pending.qsize() + (self._carry is not None),
+            "in_flight_batches": len(self._in_flight),
+            "batches": self.batches,
+            "chunks": self.chunks,
+            "batch_size": self.batch_size.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
+
+    async def _next_batch(self) -> list[EmbedRequest]:
+        first = self._carry or await self._pending.get()
+        self._carry = None
+        batch = [first]
+        size = len(first.texts)
+        deadline = first.enqueued_at + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                if not self._pending.empty():
+                    request = self._pending.get_nowait()
+                else:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    request = await asyncio.wait_for(self._pending.get(), remaining)
+            except TimeoutError:
+                break
+            if size + len(request.texts) > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    async def _collect_loop(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            await self._slots.acquire()
+            task = asyncio.create_task(self._encode(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _encode(self, batch: list[EmbedRequest]) -> None:
+        try:
+            texts = [text for request in batch for text in request.texts]
+            started = time.perf_counter()
+            for request in batch:
+                self.wait_ms.observe((started - request.enqueued_at) * 1000)
+            self.batch_size.observe(len(texts))
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self._executor, embed, texts)
+        except Exception as e:
+            for request in batch:
+                if not request.done.done():
+                    request.done.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        offset = 0
+        for request in batch:
+            if not request.done.done():
+                request.done.set_result(vectors[offset : offset + len(request.texts)])
+            offset += len(request.texts)
+        self.batches += 1
+        self.chunks += len(texts)
+        if self.batches % 100 == 0:
+            print(
+                f"[📊] Embedding batches={self.batches} chunks={self.chunks} "
+                f"batch_size(mean={self.batch_size.snapshot()['mean']}, "
+                f"p95={self.batch_size.percentile(95):g}) "
+                f"wait_ms(p50={self.wait_ms.percentile(50):g}, "
+                f"p95={self.wait_ms.percentile(95):g})"
+            )
@@ -1,13 +1,179 @@
-from typing import List
-
-
-def chunk_text(text: str, chunk_size: int = 300) -> List[str]:
-    words = text.split()
-    return [
-        " ".join(words[i : i + chunk_size])
-        for i in range(
-            0,
-            len(words),
-            chunk_size,
-        )
-    ]
+import re
+from collections.abc import Iterable, Iterator
+from functools import cache
+from typing import Any, Protocol
+
+from worker.core.config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+# Fin de frase (puntuación seguida de espacio) o de párrafo (línea en blanco)
+BOUNDARY_PATTERN = re.compile(r"(?<=[.!?…;])\s+|\n\s*\n\s*")
+# Texto sin puntuación (tablas, listados): límite para la frase en curso
+MAX_CHARS_PER_TOKEN = 16
+
+
+class Tokenizer(Protocol):
+    def count(self, text: str) -> int: ...
+
+    def split(self, text: str, max_tokens: int) -> list[str]: ...
+
+
+class WhitespaceTokenizer:
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+    def split(self, text: str, max_tokens: int) -> list[str]:
+        words = text.split()
+        return [" ".join(words[i : i + max_tokens]) for i in range(0, len(words), max_tokens)]
+
+
+class ModelTokenizer:
+    # Cuenta con el tokenizer del propio modelo de embeddings, que es lo que
+    # decide dónde trunca SentenceTransformer
+    def __init__(self, tokenizer: Any) -> None:
+        self.tokenizer = tokenizer
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def split(self, text: str, max_tokens: int) -> list[str]:
+        offsets = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+        )["offset_mapping"]
+        pieces = []
+        for i in range(0, len(offsets), max_tokens):
+            window = offsets[i : i + max_tokens]
+            end = offsets[i + max_tokens][0] if i + max_tokens < len(offsets) else len(text)
+            pieces.append(text[window[0][0] : end].strip())
+        return [piece for piece in pieces if piece]
+
+
+@cache
+def get_tokenizer() -> tuple[Tokenizer, int]:
+    from worker.services.processor import get_model
+
+    try:
+        model = get_model()
+        tokenizer = model.tokenizer
+        if not getattr(tokenizer, "is_fast", False):
+            raise TypeError("the model tokenizer does not provide offsets")
+        # [CLS] y [SEP] también ocupan sitio en la ventana del modelo
+        window = int(model.max_seq_length) - 2
+        return ModelTokenizer(tokenizer), min(CHUNK_MAX_TOKENS, window)
+    except Exception as e:
+        print(f"[!] Using whitespace tokenizer for chunking: {e}")
+        return WhitespaceTokenizer(), CHUNK_MAX_TOKENS
+
+
+class Chunker:
+    # Chunker incremental: recibe el texto por trozos (páginas, filas...) y
+    # devuelve chunks en cuanto están completos. Solo guarda la frase en curso
+    # y las frases del chunk abierto, nunca el documento entero.
+    def __init__(self, tokenizer: Tokenizer, max_tokens: int, overlap_tokens: int) -> None:
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self._tail = ""
+        # (frase, tokens, termina párrafo)
+        self._sentences: list[tuple[str, int, bool]] = []
+        self._tokens = 0
+        # Hay frases nuevas desde el último chunk (no solo solapamiento)
+        self._pending = False
+
+    def feed(self, text: str) -> Iterator[str]:
+        text = self._tail + text
+        start = 0
+        for match in BOUNDARY_PATTERN.finditer(text):
+            paragraph_end = match.group().count("\n") >= 2
+            yield from self._add_sentence(text[start : match.start()], paragraph_end)
+            start = match.end()
+        self._tail = text[start:]
+        limit = self.max_tokens * MAX_CHARS_PER_TOKEN
+        if len(self._tail) > limit:
+            cut = self._tail.rfind(" ", 0, limit) + 1 or limit
+            sentence, self._tail = self._tail[:cut], self._tail[cut:]
+            yield from self._add_sentence(sentence, False)
+
+    def close(self) -> Iterator[str]:
+        tail, self._tail = self._tail, ""
+        yield from self._add_sentence(tail, True)
+        if self._pending:
+            yield self._join(self._sentences)
+        self._sentences = []
+        self._tokens = 0
+        self._pending = False
+
+    def _add_sentence(self, sentence: str, paragraph_end: bool) -> Iterator[str]:
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            if paragraph_end and self._sentences:
+                last = self._sentences[-1]
+                self._sentences[-1] = (last[0], last[1], True)
+                yield from self._paragraph_break()
+            return
+        tokens = self.tokenizer.count(sentence)
+        if tokens > self.max_tokens:
+            # Una frase que no cabe sola se parte por tokens
+            pieces = self.tokenizer.split(sentence, self.max_tokens)
+            for piece in pieces[:-1]:
+                yield from self._append(piece, self.tokenizer.count(piece), False)
+            sentence = pieces[-1]
+            tokens = self.tokenizer.count(sentence)
+        yield from self._append(sentence, tokens, paragraph_end)
+
+    def _append(self, sentence: str, tokens: int, paragraph_end: bool) -> Iterator[str]:
+        if self._sentences and self._tokens + tokens > self.max_tokens:
+            yield from self._emit()
+            # Si el solapamiento no deja sitio a la nueva frase, se descarta
+            while self._sentences and self._tokens + tokens > self.max_tokens:
+                self._tokens -= self._sentences.pop(0)[1]
+        self._sentences.append((sentence, tokens, paragraph_end))
+        self._tokens += tokens
+        self._pending = True
+        if paragraph_end:
+            yield from self._paragraph_break()
+
+    def _paragraph_break(self) -> Iterator[str]:
+        # Un fin de párrafo cierra el chunk si ya está medio lleno: así los
+        # cortes coinciden con los párrafos y una edición no desplaza el resto
+        if self._pending and self._tokens >= self.max_tokens // 2:
+            yield from self._emit()
+
+    def _emit(self) -> Iterator[str]:
+        yield self._join(self._sentences)
+        overlap: list[tuple[str, int, bool]] = []
+        tokens = 0
+        for sentence in reversed(self._sentences[1:]):
+            if tokens + sentence[1] > self.overlap_tokens:
+                break
+            overlap.insert(0, sentence)
+            tokens += sentence[1]
+        self._sentences = overlap
+        self._tokens = tokens
+        self._pending = False
+
+    @staticmethod
+    def _join(sentences: list[tuple[str, int, bool]]) -> str:
+        parts = []
+        for i, (sentence, _, paragraph_end) in enumerate(sentences):
+            parts.append(sentence)
+            if i < len(sentences) - 1:
+                parts.append("\n\n" if paragraph_end else " ")
+        return "".join(parts)
+
+
+def new_chunker() -> Chunker:
+    tokenizer, max_tokens = get_tokenizer()
+    return Chunker(tokenizer, max_tokens, CHUNK_OVERLAP_TOKENS)
+
+
+def iter_chunks(pieces: Iterable[str]) -> Iterator[str]:
+    chunker = new_chunker()
+    for piece in pieces:
+        yield from chunker.feed(piece)
+    yield from chunker.close()
+
+
+def chunk_text(text: str) -> list[str]:
+    return list(iter_chunks([text]))
@@ -1,12 +1,15 @@
 import subprocess
+import tempfile
 from pathlib import Path
 
 import docx
-import pandas as pd
-import pdfplumber
 from bs4 import BeautifulSoup
 from pptx import Presentation
 
+from worker.core.config import OFFICE_BINARY, OFFICE_TIMEOUT
+from worker.services.pdf import extract_pdf_pages, pdf_page_count
+from worker.services.tables import TABLE_MIME_TYPES, extract_table_chunks
+
 
 def extract_text(filepath: str, mime_type: str) -> str:
     if mime_type in {"text/plain", "text/markdown"}:
@@ -16,24 +19,18 @@ def extract_text(filepath: str, mime_type: str) -> str:
         with open(filepath, encoding="utf-8") as f:
             return BeautifulSoup(f, "lxml").get_text()
 
-    elif mime_type == "text/csv":
-        df = pd.read_csv(filepath)
-        return df.to_string()
+    elif mime_type in TABLE_MIME_TYPES:
+        # Texto completo para la extracción de una sola vez; el pipeline de
+        # ingesta lee las tablas por ventanas con extract_table_chunks
+        return "\n\n".join(extract_table_chunks(filepath, mime_type))
 
     elif mime_type == "application/pdf":
-        with pdfplumber.open(filepath) as pdf:
-            return "\n".join(p.extract_text() or "" for p in pdf.pages)
+        pages = extract_pdf_pages(filepath, 0, pdf_page_count(filepath))
+        return "\n".join(page.text for page in pages)
 
     elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
         return "\n".join(p.text for p in docx.Document(filepath).paragraphs)
 
-    elif mime_type in {
-        "application/vnd.ms-excel",
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    }:
-        df = pd.read_excel(filepath)
-        return df.to_string()
-
     elif mime_type in {
         "application/vnd.ms-powerpoint",
         "application/vnd.openxmlformats-officedocument.presentationml.presentation",
@@ -48,20 +45,22 @@ def extract_text(filepath: str, mime_type: str) -> str:
         "application/vnd.oasis.opendocument.spreadsheet",
         "application/vnd.oasis.opendocument.presentation",
     }:
-        txt_path = filepath + ".txt"
-        subprocess.run(
-            [
-                "libreoffice",
-                "--headless",
-                "--convert-to",
-                "txt:Text",
-                filepath,
-                "--outdir",
-                Path(filepath).parent,
-            ],
-            check=True,
-        )
-        return Path(txt_path).read_text(encoding="utf-8")
+        # Conversión puntual; el pipeline usa los conversores persistentes de office.py
+        with tempfile.TemporaryDirectory(prefix="office-") as outdir:
+            subprocess.run(
+                [
+                    OFFICE_BINARY,
+                    "--headless",
+                    "--convert-to",
+                    "txt:Text",
+                    filepath,
+                    "--outdir",
+                    outdir,
+                ],
+                check=True,
+                timeout=OFFICE_TIMEOUT,
+            )
+            return (Path(outdir) / f"{Path(filepath).stem}.txt").read_text(encoding="utf-8")
 
     else:
         raise ValueError(f"Unsupported MIME type: {mime_type}")
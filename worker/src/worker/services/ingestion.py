@@ -0,0 +1,364 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from worker.core.config import PDF_PAGES_PER_TASK, PDF_SLOW_PAGE_SECONDS, UPLOAD_DIR
+from worker.core.metrics import Histogram
+from worker.services.batcher import EmbeddingBatcher
+from worker.services.chunk_text import get_tokenizer, new_chunker
+from worker.services.extract_text import extract_text
+from worker.services.office import ODF_MIME_TYPES, office_pool
+from worker.services.pdf import extract_pdf_pages, pdf_page_count
+from worker.services.processor import (
+    ChunkDiff,
+    apply_chunk_diff,
+    chunk_point_ids,
+    classify_chunks,
+    diff_chunks,
+    duplicate_chunks,
+    get_model,
+    stored_points,
+)
+from worker.services.tables import TABLE_MIME_TYPES, extract_table_chunks
+
+Stage = Callable[["IngestJob"], Awaitable[None]]
+T = TypeVar("T")
+# Ventanas de una tabla en cola entre dos etapas del mismo fichero
+WINDOWS_IN_FLIGHT = 2
+
+
+async def iterate_in_thread(items: Callable[[], Iterator[T]], maxsize: int) -> AsyncIterator[T]:
+    # Recorre un generador bloqueante en un hilo; la cola acotada frena al
+    # productor si el consumidor va más lento
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[tuple[bool, Any]] = asyncio.Queue(maxsize)
+    stop = threading.Event()
+
+    def produce() -> None:
+        try:
+            for item in items():
+                if stop.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(queue.put((False, item)), loop).result()
+            end: tuple[bool, Any] = (True, None)
+        except Exception as e:
+            end = (True, e)
+        asyncio.run_coroutine_threadsafe(queue.put(end), loop).result()
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            finished, item = await queue.get()
+            if finished:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+        # Se vacía la cola para que el productor no se quede bloqueado en put
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait([producer], timeout=0.05)
+
+
+class JobAborted(Exception):
+    pass
+
+
+@dataclass
+class Window:
+    offset: int
+    chunks: list[str] = field(default_factory=list)
+    diff: ChunkDiff | None = None
+    vectors: list[list[float]] = field(default_factory=list)
+
+
+@dataclass
+class IngestJob:
+    file: dict[str, Any]
+    filepath: str
+    done: asyncio.Future[int]
+    started_at: float = field(default_factory=time.perf_counter)
+    chunks: list[str] = field(default_factory=list)
+    diff: ChunkDiff | None = None
+    # Vectores ya calculados para el mismo contenido en otro fichero
+    source_vectors: list[list[float]] | None = None
+    vectors: list[list[float]] = field(default_factory=list)
+    # Tablas: los chunks no se juntan en `chunks`, pasan de una etapa a la
+    # siguiente por ventanas en colas acotadas y las tres etapas van a la vez
+    windows: asyncio.Queue[Window | None] | None = None
+    embedded: asyncio.Queue[Window | None] | None = None
+
+    async def wait(self, step: Awaitable[T]) -> T:
+        # Espera a step salvo que otra etapa del fichero falle antes: así
+        # ninguna se queda bloqueada en una cola que ya nadie va a atender
+        task = asyncio.ensure_future(step)
+        await asyncio.wait([task, self.done], return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            raise JobAborted(self.file["filename"])
+        return task.result()
+
+
+class IngestionEngine:
+    # Pipeline por etapas con colas acotadas: la extracción de texto (CPU) va a
+    # un pool de procesos, el embedding a un executor dedicado y la escritura
+    # en Qdrant es asíncrona, así la E/S y la CPU se solapan entre ficheros.
+    def __init__(
+        self,
+        extract_workers: int,
+        embed_workers: int,
+        upsert_workers: int,
+        queue_size: int,
+        batch_size: int,
+        batch_max_wait: float,
+    ) -> None:
+        self.extract_workers = extract_workers
+        self.embed_workers = embed_workers
+        self.upsert_workers = upsert_workers
+        self.queue_size = queue_size
+        self.ingested = 0
+        self.failed = 0
+        self.pdf_pages: dict[str, int] = {}
+        self.pdf_page_ms = Histogram([10, 50, 100, 250, 500, 1000, 2000, 5000])
+        self._extract_queue: asyncio.Queue[IngestJob] = asyncio.Queue(queue_size)
+        self._embed_queue: asyncio.Queue[IngestJob] = asyncio.Queue(queue_size)
+        self._upsert_queue: asyncio.Queue[IngestJob] = asyncio.Queue(queue_size)
+        self._process_pool: Executor | None = None
+        self._embed_pool: Executor | None = None
+        self.batcher = EmbeddingBatcher(batch_size, batch_max_wait, embed_workers)
+        self._tasks: list[asyncio.Task[None]] = []
+
+    async def start(self) -> None:
+        get_model()
+        get_tokenizer()
+        # spawn: los procesos de extracción no heredan el modelo ni los hilos de torch
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=self.extract_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._embed_pool = ThreadPoolExecutor(
+            max_workers=self.embed_workers,
+            thread_name_prefix="embed",
+        )
+        self.batcher.start(self._embed_pool)
+        # La etapa de embedding solo espera al batcher: hacen falta suficientes
+        # tareas en vuelo para que los lotes se llenen con chunks de varios ficheros
+        stages: list[tuple[int, asyncio.Queue[IngestJob], Stage]] = [
+            (self.extract_workers, self._extract_queue, self._extract),
+            (self.queue_size, self._embed_queue, self._embed),
+            (self.upsert_workers, self._upsert_queue, self._upsert),
+        ]
+        for workers, queue, handler in stages:
+            for _ in range(workers):
+                self._tasks.append(asyncio.create_task(self._run_stage(queue, handler)))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self.batcher.close()
+        await office_pool.close()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(cancel_futures=True)
+        if self._embed_pool is not None:
+            self._embed_pool.shutdown(cancel_futures=True)
+
+    async def ingest(self, file: dict[str, Any]) -> int:
+        filepath = os.path.join(UPLOAD_DIR, file["wallet_address"], file["filename"])
+        if not os.path.exists(filepath):
+            print(f"[!] File not found: {filepath}")
+            return 0
+        job = IngestJob(
+            file=file,
+            filepath=filepath,
+            done=asyncio.get_running_loop().create_future(),
+        )
+        await self._extract_queue.put(job)
+        return await job.done
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "extract_queue": self._extract_queue.qsize(),
+            "embed_queue": self._embed_queue.qsize(),
+            "upsert_queue": self._upsert_queue.qsize(),
+            "ingested": self.ingested,
+            "failed": self.failed,
+            "embedding": self.batcher.stats(),
+            "office": office_pool.stats(),
+            "pdf_pages": {**self.pdf_pages, "ms": self.pdf_page_ms.snapshot()},
+        }
+
+    async def _run_stage(
+        self,
+        queue: asyncio.Queue[IngestJob],
+        handler: Stage,
+    ) -> None:
+        while True:
+            job = await queue.get()
+            try:
+                if not job.done.done():
+                    await handler(job)
+            except Exception as e:
+                # Si otra etapa ya falló, el error de esta no cuenta dos veces
+                if not job.done.done():
+                    self.failed += 1
+                    job.done.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _extract(self, job: IngestJob) -> None:
+        duplicate = await duplicate_chunks(job.file)
+        if duplicate is not None:
+            job.chunks, job.source_vectors = duplicate
+            await self._embed_queue.put(job)
+            return
+
+        mime_type = job.file["mime_type"]
+        if mime_type in ODF_MIME_TYPES:
+            # ODF: se convierte con un LibreOffice persistente y se extrae el resultado
+            async with office_pool.converted(job.filepath, mime_type) as (path, converted):
+                await self._extract_file(job, path, converted)
+        else:
+            await self._extract_file(job, job.filepath, mime_type)
+
+    async def _extract_file(self, job: IngestJob, filepath: str, mime_type: str) -> None:
+        if mime_type not in TABLE_MIME_TYPES:
+            job.chunks = await self._chunks(job, filepath, mime_type)
+            await self._embed_queue.put(job)
+            return
+
+        # Tablas: las filas se leen en streaming y ya salen agrupadas en chunks;
+        # el embedding empieza con la primera ventana, sin esperar a la hoja entera
+        job.windows = asyncio.Queue(WINDOWS_IN_FLIGHT)
+        job.embedded = asyncio.Queue(WINDOWS_IN_FLIGHT)
+        await self._embed_queue.put(job)
+        size = self.batcher.max_batch_size
+        window = Window(offset=0)
+        async with aclosing(
+            iterate_in_thread(lambda: extract_table_chunks(filepath, mime_type), self.queue_size)
+        ) as chunks:
+            async for chunk in chunks:
+                window.chunks.append(chunk)
+                if len(window.chunks) == size:
+                    await job.wait(job.windows.put(window))
+                    window = Window(offset=window.offset + size)
+        if window.chunks:
+            await job.wait(job.windows.put(window))
+        await job.wait(job.windows.put(None))
+
+    async def _chunks(self, job: IngestJob, filepath: str, mime_type: str) -> list[str]:
+        # El texto llega por trozos (páginas en el caso de PDF) y se va
+        # troceando según llega, sin juntar el documento entero en memoria
+        chunker = new_chunker()
+        chunks: list[str] = []
+        async for piece in self._pieces(job, filepath, mime_type):
+            chunks += await asyncio.to_thread(list, chunker.feed(piece))
+        chunks += await asyncio.to_thread(list, chunker.close())
+        return chunks
+
+    async def _pieces(self, job: IngestJob, filepath: str, mime_type: str) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        if mime_type != "application/pdf":
+            yield await loop.run_in_executor(
+                self._process_pool,
+                extract_text,
+                filepath,
+                mime_type,
+            )
+            return
+
+        # PDF: rangos de páginas en paralelo en el pool, entregados en orden
+        count = await loop.run_in_executor(self._process_pool, pdf_page_count, filepath)
+        ranges = [
+            loop.run_in_executor(
+                self._process_pool,
+                extract_pdf_pages,
+                filepath,
+                start,
+                min(start + PDF_PAGES_PER_TASK, count),
+            )
+            for start in range(0, count, PDF_PAGES_PER_TASK)
+        ]
+        try:
+            for pending in ranges:
+                for page in await pending:
+                    self.pdf_pages[page.method] = self.pdf_pages.get(page.method, 0) + 1
+                    self.pdf_page_ms.observe(page.seconds * 1000)
+                    if page.seconds >= PDF_SLOW_PAGE_SECONDS:
+                        print(
+                            f"[🐢] Slow page {page.number}/{count} in {job.file['filename']}: "
+                            f"{page.seconds:.2f}s ({page.method})"
+                        )
+                    yield page.text + "\n"
+        finally:
+            for pending in ranges:
+                pending.cancel()
+
+    async def _embed(self, job: IngestJob) -> None:
+        if job.windows is not None:
+            await self._embed_windows(job)
+            return
+        job.diff = await diff_chunks(job.file, job.chunks)
+        if job.source_vectors is not None:
+            job.vectors = [job.source_vectors[i] for i in job.diff.new]
+            job.source_vectors = None
+        else:
+            job.vectors = await self.batcher.embed([job.chunks[i] for i in job.diff.new])
+        await self._upsert_queue.put(job)
+
+    async def _embed_windows(self, job: IngestJob) -> None:
+        assert job.windows is not None and job.embedded is not None
+        # La escritura de cada ventana empieza en cuanto tiene sus vectores
+        await self._upsert_queue.put(job)
+        stored = await stored_points(job.file)
+        remaining = set(stored)
+        seen: dict[str, int] = {}
+        while (window := await job.wait(job.windows.get())) is not None:
+            ids = chunk_point_ids(job.file, window.chunks, seen)
+            remaining.difference_update(ids)
+            window.diff = classify_chunks(job.file, ids, stored, window.offset)
+            window.vectors = await self.batcher.embed([window.chunks[i] for i in window.diff.new])
+            await job.wait(job.embedded.put(window))
+        # Los puntos guardados que no han aparecido ya no están en el fichero
+        job.diff = ChunkDiff(ids=[], stale=list(remaining))
+        await job.wait(job.embedded.put(None))
+
+    async def _upsert(self, job: IngestJob) -> None:
+        if job.embedded is not None:
+            count, total = await self._upsert_windows(job)
+        else:
+            assert job.diff is not None
+            count = await apply_chunk_diff(job.file, job.chunks, job.diff, job.vectors)
+            total = len(job.chunks)
+        assert job.diff is not None
+        self.ingested += 1
+        elapsed = time.perf_counter() - job.started_at
+        print(
+            f"[+] Ingested {job.file['filename']} in {elapsed:.2f}s: "
+            f"{count} new, {total - count} reused, {len(job.diff.stale)} removed"
+        )
+        job.done.set_result(count)
+
+    async def _upsert_windows(self, job: IngestJob) -> tuple[int, int]:
+        assert job.embedded is not None
+        count = total = 0
+        while (window := await job.wait(job.embedded.get())) is not None:
+            assert window.diff is not None
+            count += await apply_chunk_diff(
+                job.file, window.chunks, window.diff, window.vectors, window.offset
+            )
+            total += len(window.chunks)
+        assert job.diff is not None
+        await apply_chunk_diff(job.file, [], job.diff, [])
+        return count, total
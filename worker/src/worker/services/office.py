@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import tempfile
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+from worker.core.config import (
+    OFFICE_BINARY,
+    OFFICE_PYTHON,
+    OFFICE_START_TIMEOUT,
+    OFFICE_TIMEOUT,
+    OFFICE_WORKERS,
+)
+
+BRIDGE = str(Path(__file__).with_name("office_bridge.py"))
+
+# Formato al que se convierte cada documento ODF y con qué extractor se lee
+# después: texto plano, xlsx (todas las hojas, por filas con openpyxl; csv solo
+# exportaría la primera hoja) o pptx
+CONVERSIONS: dict[str, tuple[str, str, str, str]] = {
+    "application/vnd.oasis.opendocument.text": (
+        "txt",
+        "Text (encoded)",
+        "UTF8",
+        "text/plain",
+    ),
+    "application/vnd.oasis.opendocument.spreadsheet": (
+        "xlsx",
+        "Calc MS Excel 2007 XML",
+        "",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "application/vnd.oasis.opendocument.presentation": (
+        "pptx",
+        "Impress MS PowerPoint 2007 XML",
+        "",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ),
+}
+ODF_MIME_TYPES = set(CONVERSIONS)
+
+
+class OfficeConverterError(Exception):
+    pass
+
+
+class OfficeConverter:
+    # Un proceso puente con su propio soffice y su propio perfil de usuario
+    def __init__(self, workdir: str, index: int) -> None:
+        self.profile = os.path.join(workdir, f"profile-{index}")
+        self.conversions = 0
+        self.restarts = 0
+        self._process: asyncio.subprocess.Process | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            OFFICE_PYTHON,
+            BRIDGE,
+            "--office",
+            OFFICE_BINARY,
+            "--profile",
+            self.profile,
+            "--timeout",
+            str(OFFICE_START_TIMEOUT),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            # Sesión propia para poder matar también al soffice hijo
+            start_new_session=True,
+        )
+        try:
+            reply = await self._read(OFFICE_START_TIMEOUT)
+        except Exception:
+            await self.stop()
+            raise
+        if not reply.get("ready"):
+            await self.stop()
+            raise OfficeConverterError(f"Office converter failed to start: {reply}")
+
+    async def stop(self) -> None:
+        process, self._process = self._process, None
+        if process is None or process.returncode is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+    async def restart(self) -> None:
+        self.restarts += 1
+        await self.stop()
+        await self.start()
+
+    async def convert(self, request: dict[str, Any]) -> None:
+        if not self.alive:
+            await self.restart()
+        assert self._process is not None and self._process.stdin is not None
+        try:
+            self._process.stdin.write(json.dumps(request).encode() + b"\n")
+            await self._process.stdin.drain()
+            reply = await self._read(OFFICE_TIMEOUT)
+        except asyncio.CancelledError:
+            # Una respuesta pendiente desincronizaría la siguiente petición
+            await self.stop()
+            raise
+        if not reply.get("ok"):
+            raise OfficeConverterError(reply.get("error", "conversion failed"))
+        self.conversions += 1
+
+    async def _read(self, timeout: float) -> dict[str, Any]:
+        assert self._process is not None and self._process.stdout is not None
+        try:
+            line = await asyncio.wait_for(self._process.stdout.readline(), timeout)
+        except TimeoutError as e:
+            # Un documento colgado deja el soffice inservible: se mata y se rehace
+            await self.stop()
+            raise OfficeConverterError(f"Office conversion timed out after {timeout}s") from e
+        if not line:
+            await self.stop()
+            raise OfficeConverterError("Office converter exited unexpectedly")
+        reply: dict[str, Any] = json.loads(line)
+        return reply
+
+
+class OfficeConverterPool:
+    # Procesos LibreOffice persistentes: el arranque en frío se paga una vez
+    # por proceso y no una vez por documento. Las peticiones esperan en cola
+    # (FIFO) a que quede un conversor libre.
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.failures = 0
+        self._workdir: str | None = None
+        self._converters: list[OfficeConverter] = []
+        self._idle: asyncio.Queue[OfficeConverter] = asyncio.Queue()
+        self._start_lock = asyncio.Lock()
+
+    async def close(self) -> None:
+        for converter in self._converters:
+            await converter.stop()
+        self._converters.clear()
+        self._idle = asyncio.Queue()
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": len(self._converters),
+            "idle": self._idle.qsize(),
+            "conversions": sum(converter.conversions for converter in self._converters),
+            "restarts": sum(converter.restarts for converter in self._converters),
+            "failures": self.failures,
+        }
+
+    @asynccontextmanager
+    async def converted(self, filepath: str, mime_type: str) -> AsyncIterator[tuple[str, str]]:
+        # Devuelve la ruta del fichero convertido (en un directorio temporal,
+        # nunca junto al original) y el MIME con el que hay que extraerlo
+        extension, filter_name, options, target_mime = CONVERSIONS[mime_type]
+        workdir = await self._ensure_started()
+        target = os.path.join(workdir, f"{uuid.uuid4().hex}.{extension}")
+        converter = await self._idle.get()
+        try:
+            await converter.convert(
+                {
+                    "source": os.path.abspath(filepath),
+                    "target": target,
+                    "filter": filter_name,
+                    "options": options,
+                }
+            )
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self._idle.put_nowait(converter)
+        try:
+            yield target, target_mime
+        finally:
+            Path(target).unlink(missing_ok=True)
+
+    async def _ensure_started(self) -> str:
+        # Arranque diferido: los soffice solo se levantan si llega algún ODF
+        async with self._start_lock:
+            if self._workdir is None:
+                self._workdir = tempfile.mkdtemp(prefix="office-")
+                self._converters = [
+                    OfficeConverter(self._workdir, index) for index in range(self.size)
+                ]
+                results = await asyncio.gather(
+                    *(converter.start() for converter in self._converters),
+                    return_exceptions=True,
+                )
+                # Los que no arrancaron se reintentan al usarlos (convert reinicia)
+                for converter in self._converters:
+                    self._idle.put_nowait(converter)
+                errors = [result for result in results if isinstance(result, BaseException)]
+                if len(errors) == len(results):
+                    raise OfficeConverterError(f"No office converter could start: {errors[0]}")
+                print(f"[+] Started {len(results) - len(errors)} office converters")
+        return self._workdir
+
+
+office_pool = OfficeConverterPool(size=OFFICE_WORKERS)
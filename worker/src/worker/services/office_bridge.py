@@ -0,0 +1,103 @@
+# Proceso puente hacia LibreOffice. Se ejecuta con el Python del sistema que
+# trae los bindings de UNO (no con el del worker): arranca un soffice headless
+# propio, se conecta por una pipe UNO y atiende peticiones de conversión en
+# JSON por líneas (stdin -> stdout) hasta que se cierra stdin.
+import argparse
+import json
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any
+
+import uno  # type: ignore[import-not-found]
+from com.sun.star.beans import PropertyValue  # type: ignore[import-not-found]
+
+
+def prop(name: str, value: Any) -> Any:
+    p = PropertyValue()
+    p.Name = name
+    p.Value = value
+    return p
+
+
+def connect(office: str, profile: str, timeout: float) -> tuple[subprocess.Popen[bytes], Any]:
+    pipe = f"democracy-{uuid.uuid4().hex}"
+    process = subprocess.Popen(
+        [
+            office,
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--nodefault",
+            "--norestore",
+            "--nolockcheck",
+            f"-env:UserInstallation={uno.systemPathToFileUrl(profile)}",
+            f"--accept=pipe,name={pipe};urp;StarOffice.ComponentContext",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", local
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            context = resolver.resolve(f"uno:pipe,name={pipe};urp;StarOffice.ComponentContext")
+            break
+        except Exception:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.2)
+    desktop = context.ServiceManager.createInstanceWithContext(
+        "com.sun.star.frame.Desktop", context
+    )
+    return process, desktop
+
+
+def convert(desktop: Any, request: dict[str, Any]) -> None:
+    document = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(request["source"]),
+        "_blank",
+        0,
+        (prop("Hidden", True), prop("ReadOnly", True)),
+    )
+    try:
+        options = [prop("FilterName", request["filter"])]
+        if request.get("options"):
+            options.append(prop("FilterOptions", request["options"]))
+        document.storeToURL(uno.systemPathToFileUrl(request["target"]), tuple(options))
+    finally:
+        document.close(True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--office", default="soffice")
+    parser.add_argument("--profile", required=True)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    process, desktop = connect(args.office, args.profile, args.timeout)
+    print(json.dumps({"ready": True}), flush=True)
+    try:
+        for line in sys.stdin:
+            try:
+                convert(desktop, json.loads(line))
+                reply: dict[str, Any] = {"ok": True}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            print(json.dumps(reply), flush=True)
+    finally:
+        try:
+            desktop.terminate()
+        except Exception:
+            pass
+        process.kill()
+
+
+if __name__ == "__main__":
+    main()
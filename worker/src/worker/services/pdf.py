@@ -0,0 +1,71 @@
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import pdfplumber
+import pypdfium2 as pdfium
+
+from worker.core.config import PDF_EXTRACTOR
+
+# pdfium marca con U+FFFE (o 0x02) los guiones de partición de palabra
+SOFT_HYPHENS = ("\ufffe", "\x02")
+# Proporción de glifos sin mapear a partir de la cual se prefiere pdfplumber
+MAX_UNMAPPED_RATIO = 0.01
+
+
+@dataclass
+class PdfPage:
+    number: int
+    text: str
+    seconds: float
+    method: str
+
+
+def pdf_page_count(filepath: str) -> int:
+    pdf = pdfium.PdfDocument(filepath)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _pdfium_text(pdf: pdfium.PdfDocument, index: int) -> str:
+    page = pdf[index]
+    textpage = page.get_textpage()
+    try:
+        text: str = textpage.get_text_range()
+    finally:
+        textpage.close()
+        page.close()
+    for hyphen in SOFT_HYPHENS:
+        text = text.replace(hyphen + "\r\n", "").replace(hyphen, "")
+    return text.replace("\r\n", "\n")
+
+
+def _usable(text: str) -> bool:
+    stripped = text.strip()
+    return bool(stripped) and stripped.count("\ufffd") <= len(stripped) * MAX_UNMAPPED_RATIO
+
+
+def extract_pdf_pages(filepath: str, start: int, stop: int) -> list[PdfPage]:
+    # Se ejecuta en el pool de procesos: cada rango abre su propia copia del PDF
+    pages = []
+    pdf = pdfium.PdfDocument(filepath)
+    plumber: Any = None
+    try:
+        for index in range(start, stop):
+            began = time.perf_counter()
+            text = _pdfium_text(pdf, index) if PDF_EXTRACTOR != "pdfplumber" else ""
+            method = "pdfium"
+            # Capa de texto vacía o con glifos sin mapear: se intenta con pdfplumber
+            if PDF_EXTRACTOR != "pdfium" and not _usable(text):
+                if plumber is None:
+                    plumber = pdfplumber.open(filepath)
+                text = plumber.pages[index].extract_text() or ""
+                method = "pdfplumber"
+            pages.append(PdfPage(index + 1, text, time.perf_counter() - began, method))
+    finally:
+        pdf.close()
+        if plumber is not None:
+            plumber.close()
+    return pages
@@ -1,112 +1,291 @@
-import json
-import os
+import asyncio
+import hashlib
 import uuid
+from dataclasses import dataclass, field
+from functools import cache
+from typing import Any, cast
 
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.models import (
     Distance,
     FieldCondition,
     Filter,
+    FilterSelector,
+    MatchAny,
     MatchValue,
+    PayloadSchemaType,
     PointIdsList,
     PointStruct,
+    SetPayload,
+    SetPayloadOperation,
     VectorParams,
 )
 from sentence_transformers import SentenceTransformer
 
-from worker.core.config import EMBEDDING_MODEL, QDRANT_URL, UPLOAD_DIR
-from worker.services.chunk_text import chunk_text
-from worker.services.extract_text import extract_text
+from worker.core.config import (
+    EMBEDDING_MODEL,
+    INGEST_INCREMENTAL,
+    QDRANT_COLLECTION,
+    QDRANT_SCROLL_LIMIT,
+    QDRANT_URL,
+)
 
-model = SentenceTransformer(EMBEDDING_MODEL)
-qdrant = QdrantClient(url=QDRANT_URL)
+qdrant = AsyncQdrantClient(location=QDRANT_URL)
+POINT_NAMESPACE = uuid.UUID("6f0c1a52-3b8e-4d47-9a51-2f4de0b7c9a1")
 
+_collection_lock = asyncio.Lock()
+_collection_ready = False
 
-async def process_file(payload: str) -> None:
-    data = json.loads(payload)
-    file = data["file"]
 
-    wallet = file["wallet_address"]
-    filename = file["filename"]
-    mime_type = file["mime_type"]
-    created_at = file.get("created_at")
+@cache
+def get_model() -> SentenceTransformer:
+    # Carga diferida: los procesos de extracción importan este módulo y no
+    # necesitan el modelo
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def embed(chunks: list[str]) -> list[list[float]]:
+    vectors: list[list[float]] = get_model().encode(chunks).tolist()
+    return vectors
 
-    filepath = os.path.join(UPLOAD_DIR, wallet, filename)
-    if not os.path.exists(filepath):
-        print(f"[!] File not found: {filepath}")
-        return
 
-    try:
-        text = extract_text(filepath, mime_type)
-    except Exception as e:
-        print(f"[!] Error extracting text from {filename}: {e}")
+async def ensure_collection(vector_size: int) -> None:
+    global _collection_ready
+    if _collection_ready:
         return
+    async with _collection_lock:
+        if _collection_ready:
+            return
+        if not await qdrant.collection_exists(QDRANT_COLLECTION):
+            await qdrant.create_collection(
+                collection_name=QDRANT_COLLECTION,
+                vectors_config=VectorParams(
+                    size=vector_size,
+                    distance=Distance.COSINE,
+                ),
+            )
+        # Índices de payload para que los filtros por wallet y fichero no
+        # recorran toda la colección (crearlos de nuevo no hace nada)
+        for field_name in ("wallet_address", "filename", "content_hash"):
+            await qdrant.create_payload_index(
+                collection_name=QDRANT_COLLECTION,
+                field_name=field_name,
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+        _collection_ready = True
 
-    chunks = chunk_text(text)
-    vectors = model.encode(chunks).tolist()
 
-    collection = "program_chunks"
-    if not qdrant.collection_exists(collection):
-        qdrant.recreate_collection(
-            collection_name=collection,
-            vectors_config=VectorParams(
-                size=len(vectors[0]),
-                distance=Distance.COSINE,
+def file_filter(file: dict[str, Any]) -> Filter:
+    return Filter(
+        must=[
+            FieldCondition(
+                key="wallet_address",
+                match=MatchValue(value=file["wallet_address"]),
+            ),
+            FieldCondition(
+                key="filename",
+                match=MatchValue(value=file["filename"]),
             ),
+        ]
+    )
+
+
+def chunk_point_ids(
+    file: dict[str, Any],
+    chunks: list[str],
+    seen: dict[str, int] | None = None,
+) -> list[str]:
+    # ID determinista: el mismo chunk del mismo fichero siempre cae en el mismo
+    # punto, así un mensaje re-entregado sobrescribe en vez de duplicar. El
+    # índice de aparición distingue chunks repetidos dentro del fichero; `seen`
+    # se comparte entre ventanas cuando el fichero llega por partes.
+    seen = {} if seen is None else seen
+    ids = []
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk.encode()).hexdigest()
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        name = f"{file['wallet_address']}/{file['filename']}/{digest}/{occurrence}"
+        ids.append(str(uuid.uuid5(POINT_NAMESPACE, name)))
+    return ids
+
+
+async def stored_points(file: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    if not await qdrant.collection_exists(QDRANT_COLLECTION):
+        return {}
+    points: dict[str, dict[str, Any]] = {}
+    offset = None
+    while True:
+        page, offset = await qdrant.scroll(
+            collection_name=QDRANT_COLLECTION,
+            scroll_filter=file_filter(file),
+            with_payload=["chunk_id", "created_at", "content_hash"],
+            with_vectors=False,
+            limit=QDRANT_SCROLL_LIMIT,
+            offset=offset,
         )
+        for point in page:
+            points[str(point.id)] = point.payload or {}
+        if offset is None:
+            return points
+
+
+@dataclass
+class ChunkDiff:
+    ids: list[str]
+    new: list[int] = field(default_factory=list)
+    moved: list[int] = field(default_factory=list)
+    stale: list[str] = field(default_factory=list)
+
+
+def classify_chunks(
+    file: dict[str, Any],
+    ids: list[str],
+    stored: dict[str, dict[str, Any]],
+    offset: int = 0,
+) -> ChunkDiff:
+    # Las posiciones de la diff son relativas a ids; offset es la posición del
+    # primer chunk en el fichero
+    diff = ChunkDiff(ids=ids)
+    for position, point_id in enumerate(ids):
+        payload = stored.get(point_id)
+        if payload is None or not INGEST_INCREMENTAL:
+            diff.new.append(position)
+        elif (
+            payload.get("chunk_id") != offset + position
+            or payload.get("created_at") != file.get("created_at")
+            or payload.get("content_hash") != file.get("content_hash")
+        ):
+            diff.moved.append(position)
+    return diff
+
 
-    points = [
-        PointStruct(
-            id=str(uuid.uuid4()),
-            vector=vector,
-            payload={
-                "wallet_address": wallet,
-                "filename": filename,
-                "chunk_id": i,
-                "text": chunk,
-                "created_at": created_at,
-            },
+async def diff_chunks(file: dict[str, Any], chunks: list[str]) -> ChunkDiff:
+    ids = chunk_point_ids(file, chunks)
+    stored = await stored_points(file)
+    diff = classify_chunks(file, ids, stored)
+    diff.stale = list(stored.keys() - set(ids))
+    return diff
+
+
+async def apply_chunk_diff(
+    file: dict[str, Any],
+    chunks: list[str],
+    diff: ChunkDiff,
+    vectors: list[list[float]],
+    offset: int = 0,
+) -> int:
+    if vectors:
+        await ensure_collection(len(vectors[0]))
+        points = [
+            PointStruct(
+                id=diff.ids[position],
+                vector=vector,
+                payload={
+                    "wallet_address": file["wallet_address"],
+                    "filename": file["filename"],
+                    "chunk_id": offset + position,
+                    "text": chunks[position],
+                    "created_at": file.get("created_at"),
+                    "content_hash": file.get("content_hash"),
+                },
+            )
+            for position, vector in zip(diff.new, vectors, strict=True)
+        ]
+        await qdrant.upsert(collection_name=QDRANT_COLLECTION, points=points)
+    if diff.moved:
+        # Chunks que ya estaban pero cambiaron de posición: solo se reescribe el payload
+        await qdrant.batch_update_points(
+            collection_name=QDRANT_COLLECTION,
+            update_operations=[
+                SetPayloadOperation(
+                    set_payload=SetPayload(
+                        payload={
+                            "chunk_id": offset + position,
+                            "created_at": file.get("created_at"),
+                            "content_hash": file.get("content_hash"),
+                        },
+                        points=[diff.ids[position]],
+                    )
+                )
+                for position in diff.moved
+            ],
         )
-        for i, (chunk, vector) in enumerate(zip(chunks, vectors, strict=False))
-    ]
-
-    qdrant.upload_points(collection_name=collection, points=points)
-    print(f"[+] Ingested {len(points)} chunks from {filename}")
-
-
-def delete_file_vectors(payload: str) -> None:
-    print("delete_file_vectors 1", payload)
-    data = json.loads(payload)
-    print("delete_file_vectors 2", json)
-
-    wallet = data["wallet_address"]
-    filename = data["filename"]
-    scroll_result, _ = qdrant.scroll(
-        collection_name="program_chunks",
-        scroll_filter=Filter(
-            must=[
-                FieldCondition(
-                    key="wallet_address",
-                    match=MatchValue(value=wallet),
-                ),
-                FieldCondition(
-                    key="filename",
-                    match=MatchValue(value=filename),
-                ),
-            ]
-        ),
-        with_payload=False,
+    if diff.stale:
+        await qdrant.delete(
+            collection_name=QDRANT_COLLECTION,
+            points_selector=PointIdsList(points=list(diff.stale)),
+        )
+    return len(diff.new)
+
+
+async def duplicate_chunks(file: dict[str, Any]) -> tuple[list[str], list[list[float]]] | None:
+    # El mismo contenido ya indexado en otro fichero (otra wallet que subió el
+    # mismo PDF): se copian sus chunks y vectores sin extraer ni embeber
+    content_hash = file.get("content_hash")
+    if not content_hash or not await qdrant.collection_exists(QDRANT_COLLECTION):
+        return None
+    same_content = FieldCondition(key="content_hash", match=MatchValue(value=content_hash))
+    hits, _ = await qdrant.scroll(
+        collection_name=QDRANT_COLLECTION,
+        scroll_filter=Filter(must=[same_content], must_not=[file_filter(file)]),
+        with_payload=["wallet_address", "filename"],
         with_vectors=False,
-        limit=10000,
+        limit=1,
     )
-    print("delete_file_vectors 3")
-
-    point_ids = [point.id for point in scroll_result]
-    if point_ids:
-        qdrant.delete(
-            collection_name="program_chunks",
-            points_selector=PointIdsList(points=point_ids),
+    if not hits or not hits[0].payload:
+        return None
+    source = hits[0].payload
+    source_filter = file_filter(source)
+    assert source_filter.must is not None
+    points = []
+    offset = None
+    while True:
+        page, offset = await qdrant.scroll(
+            collection_name=QDRANT_COLLECTION,
+            scroll_filter=Filter(must=[*source_filter.must, same_content]),
+            with_payload=["chunk_id", "text"],
+            with_vectors=True,
+            limit=QDRANT_SCROLL_LIMIT,
+            offset=offset,
         )
-        print(f"[🗑️] Deleted {len(point_ids)} points for {filename}")
-    else:
-        print(f"[ℹ️] No points found for {filename}")
+        points += page
+        if offset is None:
+            break
+    points.sort(key=lambda point: (point.payload or {}).get("chunk_id", -1))
+    # Si la fuente está a medio reindexar las posiciones no cuadran: se descarta
+    if [(point.payload or {}).get("chunk_id") for point in points] != list(range(len(points))):
+        return None
+    chunks = [str((point.payload or {})["text"]) for point in points]
+    vectors = [cast(list[float], point.vector) for point in points]
+    print(f"[+] Reusing {len(chunks)} chunks of {source['filename']} for {file['filename']}")
+    return chunks, vectors
+
+
+async def delete_file_vectors(file: dict[str, Any]) -> None:
+    await delete_wallet_files(file["wallet_address"], [file["filename"]])
+
+
+async def delete_wallet_files(wallet: str, filenames: list[str]) -> None:
+    if not await qdrant.collection_exists(QDRANT_COLLECTION):
+        return
+    # Borrado por filtro en una sola llamada: no hay que traer los IDs a Python
+    # y el coste no depende del número de chunks
+    await qdrant.delete(
+        collection_name=QDRANT_COLLECTION,
+        points_selector=FilterSelector(
+            filter=Filter(
+                must=[
+                    FieldCondition(
+                        key="wallet_address",
+                        match=MatchValue(value=wallet),
+                    ),
+                    FieldCondition(
+                        key="filename",
+                        match=MatchAny(any=filenames),
+                    ),
+                ]
+            )
+        ),
+    )
+    print(f"[🗑️] Deleted vectors of {wallet}: {', '.join(filenames)}")
@@ -0,0 +1,114 @@
+import csv
+import zipfile
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any
+
+import openpyxl
+import pandas as pd
+
+from worker.services.chunk_text import get_tokenizer
+
+CSV_MIME_TYPES = {"text/csv"}
+EXCEL_MIME_TYPES = {
+    "application/vnd.ms-excel",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+TABLE_MIME_TYPES = CSV_MIME_TYPES | EXCEL_MIME_TYPES
+# Tokens reservados para la línea de contexto de cada grupo
+TITLE_TOKENS = 16
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return " ".join(str(value).split())
+
+
+def _csv_rows(filepath: str) -> Iterator[tuple[str, Sequence[Any]]]:
+    with open(filepath, newline="", encoding="utf-8-sig", errors="replace") as f:
+        try:
+            dialect: Any = csv.Sniffer().sniff(f.read(8192), delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        for row in csv.reader(f, dialect):
+            yield "", row
+
+
+def _xlsx_rows(filepath: str) -> Iterator[tuple[str, Sequence[Any]]]:
+    # read_only: las filas se leen del XML según se iteran, sin cargar la hoja
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows(values_only=True):
+                yield sheet.title, row
+    finally:
+        workbook.close()
+
+
+def _xls_rows(filepath: str) -> Iterator[tuple[str, Sequence[Any]]]:
+    # Formato binario antiguo: no hay lector incremental, se mantiene pandas
+    sheets = pd.read_excel(filepath, sheet_name=None, header=None, dtype=object)
+    for title, df in sheets.items():
+        for row in df.itertuples(index=False):
+            yield str(title), [None if pd.isna(value) else value for value in row]
+
+
+def table_rows(filepath: str, mime_type: str) -> Iterator[tuple[str, Sequence[Any]]]:
+    if mime_type in CSV_MIME_TYPES:
+        return _csv_rows(filepath)
+    if zipfile.is_zipfile(filepath):
+        return _xlsx_rows(filepath)
+    return _xls_rows(filepath)
+
+
+def row_group_chunks(rows: Iterable[tuple[str, Sequence[Any]]]) -> Iterator[str]:
+    # Cada chunk es un grupo de filas con el nombre de la hoja y las columnas,
+    # de forma que cada fila se lea como "columna: valor" fuera de contexto
+    tokenizer, max_tokens = get_tokenizer()
+    budget = max_tokens - TITLE_TOKENS
+    sheet: str | None = None
+    header: list[str] = []
+    group: list[str] = []
+    tokens = 0
+    first = last = 0
+
+    def flush() -> Iterator[str]:
+        if group:
+            title = f"Hoja {sheet}, filas {first}-{last}" if sheet else f"Filas {first}-{last}"
+            yield title + "\n" + "\n".join(group)
+
+    number = 0
+    for title, row in rows:
+        if title != sheet:
+            yield from flush()
+            sheet, header, group, tokens, number = title, [], [], 0, 0
+        number += 1
+        values = [_cell(value) for value in row]
+        if not any(values):
+            continue
+        if not header:
+            header = [value or f"columna {i + 1}" for i, value in enumerate(values)]
+            continue
+        header += [f"columna {i + 1}" for i in range(len(header), len(values))]
+        line = "; ".join(f"{name}: {value}" for name, value in zip(header, values) if value)
+        count = tokenizer.count(line)
+        pieces = [(line, count)]
+        if count > budget:
+            pieces = [(piece, tokenizer.count(piece)) for piece in tokenizer.split(line, budget)]
+        for piece, count in pieces:
+            if group and tokens + count > budget:
+                yield from flush()
+                group, tokens = [], 0
+            if not group:
+                first = number
+            group.append(piece)
+            tokens += count
+            last = number
+    yield from flush()
+
+
+def extract_table_chunks(filepath: str, mime_type: str) -> Iterator[str]:
+    return row_group_chunks(table_rows(filepath, mime_type))